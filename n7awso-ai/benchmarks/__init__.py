@@ -0,0 +1 @@
+"""Offline benchmarks for the N7awsou AI services (no database required)."""
@@ -0,0 +1,91 @@
+"""
+Real-time factor benchmark for the local Whisper ASR backend on CPU.
+
+Real-time factor (RTF) is inference time divided by audio duration; below 1.0
+transcription is faster than real time. Each model size is measured with
+clips decoded one at a time and as micro-batches, the way WhisperBackend
+groups concurrent requests. Model loading is excluded from the timings.
+
+Pass recordings with --audio (any format pydub/ffmpeg can read); without them
+synthetic noise clips are used, which measures compute cost only.
+
+Usage (from the n7awso-ai directory):
+    python -m benchmarks.asr_benchmark --models tiny base --batch-size 4 --audio sample.webm
+"""
+
+import argparse
+import io
+import json
+import os
+import wave
+
+import numpy as np
+
+from services.audio_transcoding import audio_format, is_target_wav, transcode_to_pcm_wav
+from services.asr import PCM_BYTES_PER_SECOND
+from services.whisper_worker import load_model, transcribe_batch
+
+
+def synthetic_clip(seconds: float, seed: int) -> bytes:
+    rng = np.random.default_rng(seed)
+    samples = (rng.normal(0, 0.05, int(seconds * 16000)) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        wav.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+def load_clips(paths, n_synthetic: int, seconds: float):
+    if not paths:
+        return [synthetic_clip(seconds, seed) for seed in range(n_synthetic)]
+    clips = []
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        fmt = audio_format(f"audio/{os.path.splitext(path)[1].lstrip('.')}")
+        clips.append(data if fmt == "wav" and is_target_wav(data) else transcode_to_pcm_wav(data, fmt)[0])
+    return clips
+
+
+def measure(model_size: str, clips, batch_size: int, language):
+    audio_seconds = sum(len(clip) for clip in clips) / PCM_BYTES_PER_SECOND
+    inference_seconds = 0.0
+    for i in range(0, len(clips), batch_size):
+        _, seconds = transcribe_batch(model_size, clips[i:i + batch_size], language)
+        inference_seconds += seconds
+    return {
+        "batch_size": batch_size,
+        "audio_seconds": round(audio_seconds, 2),
+        "inference_seconds": round(inference_seconds, 3),
+        "real_time_factor": round(inference_seconds / audio_seconds, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Whisper CPU real-time factor benchmark")
+    parser.add_argument("--models", nargs="+", default=["tiny", "base"])
+    parser.add_argument("--audio", nargs="*", default=[])
+    parser.add_argument("--clips", type=int, default=8, help="Synthetic clips when --audio is not given")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Length of synthetic clips")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--language", default="en")
+    args = parser.parse_args()
+
+    clips = load_clips(args.audio, args.clips, args.seconds)
+    results = {}
+    for model_size in args.models:
+        load_model(model_size)
+        transcribe_batch(model_size, clips[:1], args.language)  # warm-up
+        results[model_size] = {
+            "sequential": measure(model_size, clips, 1, args.language),
+            "batched": measure(model_size, clips, args.batch_size, args.language),
+        }
+
+    print(json.dumps({"clips": len(clips), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Microbenchmark for the per-message cost of the assistant LangChain pipeline.
+
+Compares the old per-message path (prompt.partial + new chain +
+new RunnableWithMessageHistory on every message) with the chain compiled once
+at startup and the knowledge snippet passed as an input variable. A fake
+in-process chat model is used so only pipeline overhead is measured.
+
+Usage (from the n7awso-ai directory):
+    python -m benchmarks.assistant_chain_benchmark --messages 500
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+
+from langchain_core.chat_history import InMemoryChatMessageHistory
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables.history import RunnableWithMessageHistory
+
+from routers.assistance_bot import TourismAssistant
+
+KNOWLEDGE_SNIPPET = "Coastal Escape in Bejaïa - description: Discover the stunning Mediterranean coastline..."
+
+
+def build_prompt():
+    return ChatPromptTemplate.from_messages([
+        ("system", TourismAssistant._get_system_prompt(None)),
+        MessagesPlaceholder(variable_name="history"),
+        ("human", "{input}")
+    ])
+
+
+async def run_per_message_chain(llm, prompt, histories, messages):
+    """Old path: build the chain for every message"""
+    for session_id, message in messages:
+        updated_prompt = prompt.partial(knowledge_base=KNOWLEDGE_SNIPPET)
+        chain_with_history = RunnableWithMessageHistory(
+            updated_prompt | llm,
+            histories.__getitem__,
+            input_messages_key="input",
+            history_messages_key="history",
+        )
+        await chain_with_history.ainvoke({"input": message}, config={"configurable": {"session_id": session_id}})
+
+
+async def run_compiled_chain(llm, prompt, histories, messages):
+    """New path: chain compiled once, knowledge passed as an input variable"""
+    chain_with_history = RunnableWithMessageHistory(
+        prompt | llm,
+        histories.__getitem__,
+        input_messages_key="input",
+        history_messages_key="history",
+    )
+    for session_id, message in messages:
+        await chain_with_history.ainvoke(
+            {"input": message, "knowledge_base": KNOWLEDGE_SNIPPET},
+            config={"configurable": {"session_id": session_id}}
+        )
+
+
+def measure(runner, n_messages: int, n_sessions: int) -> dict:
+    llm = FakeListChatModel(responses=["Bejaia is best visited between April and September."])
+    prompt = build_prompt()
+    histories = {f"session-{i}": InMemoryChatMessageHistory() for i in range(n_sessions)}
+    messages = [(f"session-{i % n_sessions}", f"Best time to visit Bejaia? ({i})") for i in range(n_messages)]
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    asyncio.run(runner(llm, prompt, histories, messages))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    snapshot_total = sum(stat.size for stat in tracemalloc.take_snapshot().statistics("filename"))
+    tracemalloc.stop()
+
+    return {
+        "per_message_us": round(elapsed / n_messages * 1e6, 2),
+        "peak_memory_kb": round(peak / 1024, 2),
+        "retained_memory_kb": round(snapshot_total / 1024, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Assistant chain construction microbenchmark")
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--sessions", type=int, default=20)
+    args = parser.parse_args()
+
+    per_message = measure(run_per_message_chain, args.messages, args.sessions)
+    compiled = measure(run_compiled_chain, args.messages, args.sessions)
+
+    results = {
+        "messages": args.messages,
+        "per_message_chain": per_message,
+        "compiled_chain": compiled,
+        "saved_per_message_us": round(per_message["per_message_us"] - compiled["per_message_us"], 2),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Tail-latency benchmark for the hedged LLM router.
+
+Uses fake in-process chat models that sleep for a heavy-tailed latency and
+fail a fraction of calls, so hedging and failover can be measured without
+calling Groq or Gemini. Reports p50/p95/p99 and error rate for the primary
+alone and for the hedged router.
+
+Usage (from the n7awso-ai directory):
+    python -m benchmarks.llm_hedging_benchmark --requests 300
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+
+from services.latency_stats import summarize_ms
+from services.llm_router import LLMRouter, Provider
+
+
+class FakeLatencyLLM:
+    """Chat model stand-in with configurable latency distribution and error rate"""
+
+    def __init__(self, name: str, median: float, slow_fraction: float, slow_latency: float,
+                 error_rate: float, seed: int):
+        self.name = name
+        self.median = median
+        self.slow_fraction = slow_fraction
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+
+    def _latency(self) -> float:
+        if self.rng.random() < self.slow_fraction:
+            return self.slow_latency * (0.5 + self.rng.random())
+        return self.median * (0.7 + 0.6 * self.rng.random())
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(self._latency())
+        if self.rng.random() < self.error_rate:
+            raise RuntimeError(f"{self.name} returned 503")
+        return AIMessage(content=f"answer from {self.name}")
+
+    async def astream(self, messages):
+        await asyncio.sleep(self._latency())
+        if self.rng.random() < self.error_rate:
+            raise RuntimeError(f"{self.name} returned 503")
+        for token in ("answer ", "from ", self.name):
+            yield AIMessageChunk(content=token)
+
+
+async def run(router: LLMRouter, n_requests: int, concurrency: int) -> dict:
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+    messages = [HumanMessage(content="Best time to visit Bejaia?")]
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await router.ainvoke(messages)
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+
+    await asyncio.gather(*(one() for _ in range(n_requests)))
+    return {**summarize_ms(latencies, (0.5, 0.95, 0.99), digits=1), "errors": errors, **{k: v for k, v in router.stats().items() if k != "providers"}}
+
+
+def build_providers(args):
+    primary = FakeLatencyLLM("groq", args.median, args.slow_fraction, args.slow_latency, args.error_rate, args.seed)
+    secondary = FakeLatencyLLM("gemini", args.median * 1.5, args.slow_fraction, args.slow_latency, args.error_rate, args.seed + 1)
+    return Provider("groq", primary), Provider("gemini", secondary)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hedged LLM router benchmark with fake providers")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--median", type=float, default=0.05, help="Median provider latency in seconds")
+    parser.add_argument("--slow-fraction", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=1.0)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    primary, _ = build_providers(args)
+    single = asyncio.run(run(LLMRouter([primary], initial_deadline=args.median * 2), args.requests, args.concurrency))
+
+    primary, secondary = build_providers(args)
+    hedged = asyncio.run(run(LLMRouter([primary, secondary], initial_deadline=args.median * 2, min_deadline=args.median),
+                             args.requests, args.concurrency))
+
+    print(json.dumps({"requests": args.requests, "primary_only": single, "hedged": hedged}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
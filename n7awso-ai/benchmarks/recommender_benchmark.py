@@ -0,0 +1,229 @@
+"""
+Offline benchmark and evaluation harness for the recommendation system.
+
+Builds the models from synthetic in-memory frames (no database) and reports
+build time, peak memory, per-request latency and leave-one-out recall@k for
+each scorer. Results are written as JSON so runs can be compared between
+commits.
+
+Usage (from the n7awso-ai directory):
+    python -m benchmarks.recommender_benchmark --offers 2000 --users 20000 --interactions 500000
+    python -m benchmarks.recommender_benchmark --output new.json --baseline old.json
+"""
+
+import argparse
+import json
+import logging
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_data import generate_dataset
+from routers import recommendation_system as rm
+from services.latency_stats import summarize_ms
+
+logger = logging.getLogger(__name__)
+
+
+def split_leave_one_out(interactions: pd.DataFrame, n_eval_users: int, rng: np.random.Generator):
+    """Hold out the latest interacted offer of sampled users, returns (train, {user_id: offer_id})"""
+    counts = interactions.groupby('user_id')['offer_id'].nunique()
+    candidates = counts[counts >= 2].index.to_numpy()
+    if len(candidates) == 0:
+        return interactions, {}
+
+    eval_users = rng.choice(candidates, size=min(n_eval_users, len(candidates)), replace=False)
+    latest = (
+        interactions[interactions['user_id'].isin(eval_users)]
+        .sort_values('viewedAt')
+        .groupby('user_id')
+        .tail(1)
+    )
+    held_out = dict(zip(latest['user_id'], latest['offer_id']))
+
+    # Remove every row of the held-out pairs so the offer is not excluded as "already seen"
+    pair_keys = pd.MultiIndex.from_arrays([interactions['user_id'], interactions['offer_id']])
+    held_keys = pd.MultiIndex.from_arrays([latest['user_id'], latest['offer_id']])
+    train = interactions[~pair_keys.isin(held_keys)].reset_index(drop=True)
+    return train, held_out
+
+
+def top_k_from_scores(scores, exclude: set, k: int):
+    """Return the top-k offer ids from (offer_id, score) pairs, skipping excluded offers"""
+    ranked = sorted(((o_id, score) for o_id, score in scores if o_id not in exclude), key=lambda x: x[1], reverse=True)
+    return [o_id for o_id, _ in ranked[:k]]
+
+
+def latest_seed_offer(train: pd.DataFrame, user_id: int):
+    """Most recent training offer of a user, used as the offer-page seed"""
+    user_rows = train[train['user_id'] == user_id]
+    if user_rows.empty:
+        return None
+    return user_rows.loc[user_rows['viewedAt'].idxmax(), 'offer_id']
+
+
+def scorer_rankings(user_id: int, seed_offer, exclude: set, k: int):
+    """Top-k lists for every scorer for one user"""
+    offer_ids = rm.offers_df['offer_id'].to_numpy()
+    rankings = {}
+
+    rankings['hybrid_main'] = top_k_from_scores(rm.calculate_hybrid_scores(user_id, None, exclude), set(), k)
+
+    collaborative = rm.get_user_collaborative_scores(user_id)
+    rankings['collaborative'] = top_k_from_scores(collaborative.items(), exclude, k)
+
+    rankings['popularity'] = top_k_from_scores(rm.popularity_scores.items(), exclude, k)
+
+    if seed_offer is not None:
+        offer_exclude = exclude | {seed_offer}
+        seed_idx = rm.offers_df.index[rm.offers_df['offer_id'] == seed_offer][0]
+        rankings['content'] = top_k_from_scores(zip(offer_ids, rm.content_similarity[seed_idx]), offer_exclude, k)
+        rankings['hybrid_offer'] = top_k_from_scores(rm.calculate_hybrid_scores(user_id, seed_offer, offer_exclude), set(), k)
+
+    return rankings
+
+
+def percentiles_ms(samples):
+    """p50/p99/mean of latency samples in milliseconds (nearest rank, as in /recommendations/metrics)"""
+    summary = summarize_ms(samples, (0.5, 0.99), digits=3, mean=True)
+    return {
+        "p50": summary["p50_ms"],
+        "p99": summary["p99_ms"],
+        "mean": summary["mean_ms"],
+        "count": len(samples),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def run_benchmark(n_offers: int, n_users: int, n_interactions: int, seed: int, k: int, n_eval_users: int):
+    """Run the full benchmark and return the results dict"""
+    rng = np.random.default_rng(seed)
+
+    start = time.perf_counter()
+    offers, interactions = generate_dataset(n_offers, n_users, n_interactions, seed)
+    generation_seconds = time.perf_counter() - start
+
+    train, held_out = split_leave_one_out(interactions, n_eval_users, rng)
+
+    # Peak memory and build time come from separate runs: tracemalloc slows the build several-fold
+    tracemalloc.start()
+    rm.build_recommendation_models(offers, train)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    rm.build_recommendation_models(offers, train)
+    build_seconds = time.perf_counter() - start
+
+    hits = {}
+    evaluated = {}
+    main_latencies = []
+    offer_latencies = []
+
+    for user_id, target in held_out.items():
+        exclude = rm.user_interactions.get(user_id, set())
+        seed_offer = latest_seed_offer(train, user_id)
+
+        # Request latency mirrors the scoring work done by the two recommendation routes
+        start = time.perf_counter()
+        top_k_from_scores(rm.calculate_hybrid_scores(user_id, None, exclude), set(), k)
+        main_latencies.append(time.perf_counter() - start)
+
+        if seed_offer is not None:
+            start = time.perf_counter()
+            top_k_from_scores(rm.calculate_hybrid_scores(user_id, seed_offer, exclude | {seed_offer}), set(), k)
+            offer_latencies.append(time.perf_counter() - start)
+
+        for scorer, ranking in scorer_rankings(user_id, seed_offer, exclude, k).items():
+            evaluated[scorer] = evaluated.get(scorer, 0) + 1
+            hits[scorer] = hits.get(scorer, 0) + int(target in ranking)
+
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "git_commit": git_commit(),
+        "config": {
+            "offers": n_offers,
+            "users": n_users,
+            "interactions": n_interactions,
+            "seed": seed,
+            "k": k,
+            "eval_users": len(held_out),
+        },
+        "generation_seconds": round(generation_seconds, 3),
+        "build": {
+            "seconds": round(build_seconds, 3),
+            "peak_memory_mb": round(peak_bytes / (1024 * 1024), 2),
+        },
+        "latency_ms": {
+            "main_page": percentiles_ms(main_latencies),
+            "offer_page": percentiles_ms(offer_latencies),
+        },
+        "recall_at_k": {
+            scorer: round(hits[scorer] / evaluated[scorer], 4)
+            for scorer in sorted(evaluated)
+        },
+    }
+
+
+def compare_results(current: dict, baseline: dict) -> dict:
+    """Relative change of the headline metrics against a baseline run"""
+    def delta(new, old):
+        if new is None or old in (None, 0):
+            return None
+        return round((new - old) / old * 100, 2)
+
+    return {
+        "baseline_commit": baseline.get("git_commit"),
+        "build_seconds_pct": delta(current["build"]["seconds"], baseline["build"]["seconds"]),
+        "peak_memory_pct": delta(current["build"]["peak_memory_mb"], baseline["build"]["peak_memory_mb"]),
+        "latency_p99_pct": {
+            route: delta(current["latency_ms"][route]["p99"], baseline["latency_ms"][route]["p99"])
+            for route in current["latency_ms"]
+        },
+        "recall_at_k_diff": {
+            scorer: round(recall - baseline["recall_at_k"].get(scorer, 0), 4)
+            for scorer, recall in current["recall_at_k"].items()
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline recommender benchmark")
+    parser.add_argument("--offers", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--interactions", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--eval-users", type=int, default=500)
+    parser.add_argument("--output", type=Path, default=Path("benchmarks/results/recommender.json"))
+    parser.add_argument("--baseline", type=Path, default=None, help="Previous results JSON to compare against")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    results = run_benchmark(args.offers, args.users, args.interactions, args.seed, args.k, args.eval_users)
+
+    if args.baseline is not None:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            results["comparison"] = compare_results(results, json.load(file))
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2, ensure_ascii=False)
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
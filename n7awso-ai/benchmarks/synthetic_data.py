@@ -0,0 +1,106 @@
+"""
+Seeded synthetic data generator for the recommendation system.
+
+Produces offers and interactions frames with the same columns that
+initialize_recommendation_system builds from the database, so the models can
+be built and evaluated fully in memory.
+"""
+
+import numpy as np
+import pandas as pd
+
+DESTINATIONS = [
+    "Alger", "Oran", "Constantine", "Bejaia", "Jijel", "Skikda", "Setif",
+    "Annaba", "Tlemcen", "Ghardaia", "Tamanrasset", "Djanet", "Biskra",
+    "Timimoun", "Tipaza", "Boumerdes", "Mostaganem", "El Kala",
+]
+
+CATEGORIES = ["beach", "mountain", "desert", "culture", "history", "adventure", "family", "religious"]
+TRIP_TYPES = ["STANDARD", "PREMIUM", "LUXURY"]
+
+DESCRIPTION_TEMPLATES = {
+    "en": [
+        "Discover {destination} with guided {category} excursions and local cuisine",
+        "A relaxing {category} trip to {destination} with comfortable hotels and transport",
+        "Explore the hidden gems of {destination}, perfect for {category} lovers",
+    ],
+    "fr": [
+        "Découvrez {destination} avec des excursions {category} guidées et la cuisine locale",
+        "Un séjour {category} reposant à {destination} avec hôtels confortables et transport",
+        "Explorez les trésors cachés de {destination}, idéal pour les amateurs de {category}",
+    ],
+    "ar": [
+        "اكتشف {destination} مع رحلات {category} بصحبة مرشد وتذوق المطبخ المحلي",
+        "رحلة {category} مريحة إلى {destination} مع فنادق مريحة ونقل",
+        "استكشف كنوز {destination} المخفية، مثالية لمحبي {category}",
+    ],
+}
+
+LANGUAGES = list(DESCRIPTION_TEMPLATES.keys())
+
+
+def generate_offers(n_offers: int, rng: np.random.Generator) -> pd.DataFrame:
+    """Generate an offers frame with multilingual descriptions"""
+    destinations = rng.choice(DESTINATIONS, size=n_offers)
+    categories = rng.choice(CATEGORIES, size=n_offers)
+    trip_types = rng.choice(TRIP_TYPES, size=n_offers, p=[0.6, 0.3, 0.1])
+    languages = rng.choice(LANGUAGES, size=n_offers)
+    template_ids = rng.integers(0, 3, size=n_offers)
+
+    descriptions = [
+        DESCRIPTION_TEMPLATES[language][template_id].format(destination=destination, category=category)
+        for language, template_id, destination, category in zip(languages, template_ids, destinations, categories)
+    ]
+
+    offer_ids = np.arange(1, n_offers + 1)
+    return pd.DataFrame({
+        'offer_id': offer_ids,
+        'name': [f"{destination} {category} #{offer_id}" for destination, category, offer_id in zip(destinations, categories, offer_ids)],
+        'description': descriptions,
+        'price': np.round(rng.lognormal(mean=10, sigma=0.5, size=n_offers), 2),
+        'destinationLocation': destinations,
+        'departureLocation': rng.choice(DESTINATIONS, size=n_offers),
+        'category': categories,
+        'tripType': trip_types,
+        'tags': [f"{category} {trip_type}" for category, trip_type in zip(categories, trip_types)],
+        'duration': rng.integers(1, 15, size=n_offers),
+        'availableCapacity': rng.integers(10, 100, size=n_offers),
+        'language': languages,
+    })
+
+
+def generate_interactions(n_users: int, n_offers: int, n_interactions: int, rng: np.random.Generator,
+                          user_skew: float = 1.2, offer_skew: float = 1.1) -> pd.DataFrame:
+    """Generate interactions with power-law user activity and offer popularity"""
+    user_weights = 1.0 / np.arange(1, n_users + 1) ** user_skew
+    offer_weights = 1.0 / np.arange(1, n_offers + 1) ** offer_skew
+    user_weights /= user_weights.sum()
+    offer_weights /= offer_weights.sum()
+
+    # Shuffle ranks so ids are not correlated with activity
+    user_ids = rng.permutation(n_users) + 1
+    offer_ids = rng.permutation(n_offers) + 1
+
+    users = user_ids[rng.choice(n_users, size=n_interactions, p=user_weights)]
+    offers = offer_ids[rng.choice(n_offers, size=n_interactions, p=offer_weights)]
+    interaction = rng.choice([1, 2, 3, 4, 5], size=n_interactions, p=[0.4, 0.25, 0.15, 0.12, 0.08])
+    enrolled = rng.random(n_interactions) < 0.05
+
+    start = np.datetime64('2024-01-01T00:00:00')
+    viewed_at = start + rng.integers(0, 365 * 24 * 3600, size=n_interactions).astype('timedelta64[s]')
+
+    return pd.DataFrame({
+        'user_id': users,
+        'offer_id': offers,
+        'interaction': interaction,
+        'enrolled': enrolled,
+        'viewedAt': viewed_at,
+    })
+
+
+def generate_dataset(n_offers: int = 1000, n_users: int = 5000, n_interactions: int = 100000, seed: int = 42):
+    """Generate (offers_df, interactions_df) deterministically from a seed"""
+    rng = np.random.default_rng(seed)
+    offers = generate_offers(n_offers, rng)
+    interactions = generate_interactions(n_users, n_offers, n_interactions, rng)
+    return offers, interactions
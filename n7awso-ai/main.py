@@ -28,6 +28,7 @@ async def lifespan(app: FastAPI):
         logger.info("Initializing recommendation system...")
         await recommendation_system.initialize_recommendation_system()
         logger.info("Recommendation system initialized successfully")
+        recommendation_system.start_event_flusher()
     except Exception as e:
         logger.error(f"Failed to initialize recommendation system: {e}")
         # Don't fail startup, just log the error
@@ -43,6 +44,7 @@ async def lifespan(app: FastAPI):
     
     # Cleanup recommendation system
     try:
+        await recommendation_system.stop_event_flusher()
         await recommendation_system.prisma.disconnect()
         logger.info("Recommendation system disconnected")
     except Exception as e:
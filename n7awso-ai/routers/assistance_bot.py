@@ -1,36 +1,106 @@
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, UploadFile, File
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, UploadFile, File, Header, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse
-from pydantic import BaseModel, Field
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, Field, ValidationError
 from typing import List, Optional, Dict, Any
 import json
 import asyncio
 import logging
 from datetime import datetime, timedelta
+import heapq
+import math
+import time
 import uuid
 import os
-import tempfile
 import io
 from pathlib import Path
 
 # Audio processing imports
-import speech_recognition as sr
-from pydub import AudioSegment
+from services.audio_transcoding import audio_format, is_target_wav, transcode_to_pcm_wav
+from services.vad import UtteranceBuffer, trim_silence
 
 # Updated LangChain imports
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_groq import ChatGroq
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import ConfigurableFieldSpec
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.chat_history import BaseChatMessageHistory
 
 # Prisma imports
 from generated.prisma import Prisma
 
+from services.caching import ResponseCache, SessionHistoryCache, TranscriptionCache
+from services.chat_persistence import ChatMessageWriter, ChatSessionRegistry
+from services.idempotency import IdempotencyConflict, IdempotencyTable
+from services.latency_stats import StageTimings
+from services.llm_router import LLMRouter, Provider, RoutedChatModel
+from services.llm_scheduler import LLMCapacityExceeded, llm_scheduler
+from services.worker_pool import BoundedWorkerPool, WorkerPoolFull
+from services.asr import ASRBackend, ASRServiceError, UnreadableAudio, UnrecognizedSpeech, build_asr_backend
+from services.retrieval import EMBEDDERS, BM25Index, VectorIndex
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+# Voice uploads over the cap are rejected while the request body is received
+MAX_AUDIO_UPLOAD_BYTES = int(os.getenv("VOICE_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+# Room for multipart boundaries, part headers and the small form fields next to the file
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+def upload_too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Audio file too large. Maximum size: {MAX_AUDIO_UPLOAD_BYTES // (1024 * 1024)}MB")
+
+class UploadCapRoute(APIRoute):
+    """Route that caps multipart request bodies before FastAPI parses them.
+    
+    FastAPI reads the whole form (spooling parts over 1 MB to a temporary file)
+    before the endpoint runs, so an oversized upload is refused here instead: from
+    its Content-Length when declared, otherwise as soon as the received bytes pass the cap.
+    """
+    
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        
+        async def capped_handler(request: Request):
+            if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+                return await handler(request)
+            
+            limit = MAX_AUDIO_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES
+            declared = request.headers.get("content-length", "")
+            if declared.isdigit() and int(declared) > limit:
+                raise upload_too_large()
+            
+            received = 0
+            async def receive():
+                nonlocal received
+                message = await request.receive()
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise upload_too_large()
+                return message
+            
+            return await handler(Request(request.scope, receive))
+        
+        return capped_handler
+
+router = APIRouter(route_class=UploadCapRoute)
+
+# Conversation history policy
+CHAT_ROLES = ["user", "assistant"]
+SUMMARY_ROLE = "summary"
+HISTORY_WINDOW_MESSAGES = int(os.getenv("CHAT_HISTORY_WINDOW_MESSAGES", "20"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+SUMMARY_REFRESH_MESSAGES = int(os.getenv("CHAT_SUMMARY_REFRESH_MESSAGES", "10"))
+
+def summary_message_id(session_id: str) -> str:
+    """messageId of the rolling summary row stored with a session's messages"""
+    return f"summary-{session_id}"
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (about four characters per token)"""
+    return len(text) // 4 + 1
 
 # Pydantic models (keep the same)
 class ChatMessageRequest(BaseModel):
@@ -102,60 +172,166 @@ class PrismaDatabaseManager:
         if not self._connected:
             await self.connect()
 
-# Knowledge base manager (keep the same)
+# Knowledge base retrieval
 class KnowledgeBaseManager:
-    def __init__(self):
-        self.data_file = Path(__file__).parent.parent / "data" / "trip_plans.json"
-        self.knowledge_base = {}
+    """Retrieval over the trip plans and agency knowledge base.
+    
+    Both JSON files are flattened into passages and indexed once at load time
+    (BM25 keyword index and embedding index); the files are re-indexed when
+    their modification time changes.
+    """
+    
+    RELOAD_CHECK_SECONDS = 5.0
+    # Reciprocal rank fusion constant for combining keyword and vector results
+    RRF_K = 60
+    
+    def __init__(self, embedder=None):
+        data_dir = Path(__file__).parent.parent / "data"
+        self.data_files = [data_dir / "trip_plans.json", data_dir / "knowlage_base.json"]
+        if embedder is None:
+            embedder = EMBEDDERS[os.getenv("KB_EMBEDDER", "hashing")]()
+        self.embedder = embedder
+        self.passages = []
+        self.index = BM25Index([])
+        self.vector_index = VectorIndex(embedder, data_dir / "embeddings")
+        self._mtimes = {}
+        self._last_reload_check = 0.0
         self.load_knowledge_base()
     
+    @staticmethod
+    def _describe(item: Dict[str, Any]) -> str:
+        parts = []
+        for key, value in item.items():
+            if key == "id":
+                continue
+            if isinstance(value, list):
+                value = ", ".join(str(v) for v in value)
+            parts.append(f"{key.replace('_', ' ')}: {value}")
+        return "; ".join(parts)
+    
+    def _build_passages(self, source: str, data) -> List[Dict[str, Any]]:
+        passages = []
+        
+        def add(category: Optional[str], item):
+            if isinstance(item, dict):
+                title = item.get("title") or item.get("name") or category or "Info"
+                text = self._describe(item)
+            else:
+                title = category or "Info"
+                text = str(item)
+            if category and category != title:
+                title = f"{category} - {title}"
+            passages.append({"id": f"{source}:{len(passages)}", "title": title, "text": text})
+        
+        if isinstance(data, list):
+            for item in data:
+                add(None, item)
+        elif isinstance(data, dict):
+            for category, value in data.items():
+                if isinstance(value, list):
+                    for item in value:
+                        add(category, item)
+                elif isinstance(value, dict):
+                    for key, item in value.items():
+                        add(category, item if isinstance(item, dict) else {key: item})
+                else:
+                    add(category, {category: value})
+        return passages
+    
     def load_knowledge_base(self):
-        """Load the trip plans JSON"""
-        try:
-            with open(self.data_file, "r", encoding="utf-8") as file:
-                self.knowledge_base = json.load(file)
-                logger.info("Knowledge base loaded successfully.")
-        except Exception as e:
-            logger.error(f"❌ Error loading knowledge base: {e}")
+        """Load the JSON files and rebuild the retrieval index"""
+        passages = []
+        mtimes = {}
+        for data_file in self.data_files:
+            try:
+                with open(data_file, "r", encoding="utf-8") as file:
+                    data = json.load(file)
+                mtimes[data_file] = data_file.stat().st_mtime
+                passages.extend(self._build_passages(data_file.stem, data))
+            except Exception as e:
+                logger.error(f"❌ Error loading knowledge base {data_file.name}: {e}")
+        
+        texts = [f"{p['title']} {p['text']}" for p in passages]
+        vector_index = VectorIndex(self.embedder, self.vector_index.cache_dir)
+        vector_index.build(texts)
+        
+        # Swap in the new indexes in one step so readers never see a partial one
+        self.index = BM25Index(texts)
+        self.vector_index = vector_index
+        self.passages = passages
+        self._mtimes = mtimes
+        logger.info(f"Knowledge base loaded successfully ({len(passages)} passages).")
+    
+    def reload_if_changed(self) -> bool:
+        """Re-index when a knowledge base file changed on disk"""
+        now = time.monotonic()
+        if now - self._last_reload_check < self.RELOAD_CHECK_SECONDS:
+            return False
+        self._last_reload_check = now
+        
+        for data_file in self.data_files:
+            try:
+                mtime = data_file.stat().st_mtime
+            except OSError:
+                continue
+            if self._mtimes.get(data_file) != mtime:
+                self.load_knowledge_base()
+                return True
+        return False
+    
+    def search(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
+        """Top-k passages for the query, fusing keyword and vector rankings"""
+        self.reload_if_changed()
+        passages = self.passages
+        
+        fused = {}
+        for results in (self.index.search(query, k * 2), self.vector_index.search(query, k * 2)):
+            for rank, (doc_id, _) in enumerate(results):
+                fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (self.RRF_K + rank + 1)
+        
+        return [
+            {**passages[doc_id], "score": score}
+            for doc_id, score in heapq.nlargest(k, fused.items(), key=lambda item: item[1])
+        ]
+    
+    @staticmethod
+    def format_snippet(results: List[Dict[str, Any]]) -> str:
+        """Render retrieved passages for the system prompt"""
+        return "\n".join(f"{r['title']}: {r['text'][:300]}" for r in results)
     
     def get_relevant_info(self, query: str) -> str:
         """Return relevant info based on query"""
-        relevant_info = []
-        query_lower = query.lower()
-
-        # Handle both list and dict at the top level
-        if isinstance(self.knowledge_base, dict):
-            for category, data in self.knowledge_base.items():
-                if isinstance(data, dict):
-                    for key, value in data.items():
-                        if any(k in query_lower for k in [category.lower(), key.lower()]):
-                            relevant_info.append(f"{category} - {key}: {str(value)[:200]}...")
-                elif isinstance(data, list):
-                    for item in data:
-                        if isinstance(item, dict) and any(k in query_lower for k in str(item).lower().split()):
-                            relevant_info.append(f"{category}: {str(item)[:200]}...")
-        elif isinstance(self.knowledge_base, list):
-            for item in self.knowledge_base:
-                if isinstance(item, dict):
-                    # Check all string fields for a match
-                    for key, value in item.items():
-                        if isinstance(value, str) and key.lower() in query_lower:
-                            relevant_info.append(f"{item.get('title', 'Unknown')}: {str(value)[:200]}...")
-                        elif isinstance(value, list):
-                            for v in value:
-                                if isinstance(v, str) and v.lower() in query_lower:
-                                    relevant_info.append(f"{item.get('title', 'Unknown')}: {str(v)[:200]}...")
-        return "\n".join(relevant_info[:3]) if relevant_info else ""
+        return self.format_snippet(self.search(query, k=3))
 
 # Updated Chat memory manager using modern LangChain
 class PrismaChatMessageHistory(BaseChatMessageHistory):
-    """Custom chat message history using Prisma database"""
+    """Custom chat message history using Prisma database.
+    
+    Only the most recent turns are kept (HISTORY_WINDOW_MESSAGES messages within
+    HISTORY_TOKEN_BUDGET tokens); older turns are represented by the session's
+    rolling summary.
+    """
     
     def __init__(self, session_id: str, db_manager: PrismaDatabaseManager):
         self.session_id = session_id
         self.db_manager = db_manager
         self._messages = []
         self._loaded = False
+        self._size_bytes = 0
+        self._token_count = 0
+        self._summary = None
+        # Messages dropped from the window since the last summary refresh
+        self.overflow_count = 0
+    
+    @property
+    def size_bytes(self) -> int:
+        """Approximate size of the cached message contents in bytes"""
+        return self._size_bytes
+    
+    @staticmethod
+    def _message_bytes(message) -> int:
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        return len(content.encode("utf-8"))
     
     async def _ensure_loaded(self):
         """Load messages from database if not loaded"""
@@ -163,71 +339,110 @@ class PrismaChatMessageHistory(BaseChatMessageHistory):
             await self._load_messages()
             self._loaded = True
     
+    def mark_loaded(self):
+        """Skip the database load for a session that was just created"""
+        self._loaded = True
+    
     async def _load_messages(self):
         """Load messages from database"""
         await self.db_manager.ensure_connection()
         try:
-            messages = await self.db_manager.prisma.chatmessage.find_many(
-                where={"sessionId": self.session_id},
-                order=[{"timestamp": "asc"}]
+            messages, summary = await asyncio.gather(
+                self.db_manager.prisma.chatmessage.find_many(
+                    where={"sessionId": self.session_id, "role": {"in": CHAT_ROLES}},
+                    order=[{"timestamp": "desc"}],
+                    take=HISTORY_WINDOW_MESSAGES
+                ),
+                self.db_manager.prisma.chatmessage.find_unique(
+                    where={"messageId": summary_message_id(self.session_id)}
+                )
             )
-            self._messages = []
+            messages.reverse()
+            self.clear()
             for msg in messages:
                 if msg.role == "user":
-                    self._messages.append(HumanMessage(content=msg.content))
+                    self._append(HumanMessage(content=msg.content))
                 elif msg.role == "assistant":
-                    self._messages.append(AIMessage(content=msg.content))
+                    self._append(AIMessage(content=msg.content))
+            self._summary = summary.content if summary else None
+            self.overflow_count = 0
+            self._trim_window()
+            # A full or trimmed window may have older turns that are not summarized yet
+            if len(messages) >= HISTORY_WINDOW_MESSAGES or self.overflow_count:
+                self.overflow_count = SUMMARY_REFRESH_MESSAGES
         except Exception as e:
             logger.error(f"Error loading messages: {e}")
-            self._messages = []
+            self.clear()
+    
+    def _append(self, message):
+        self._messages.append(message)
+        self._size_bytes += self._message_bytes(message)
+        self._token_count += estimate_tokens(message.content if isinstance(message.content, str) else str(message.content))
+    
+    def _trim_window(self):
+        """Drop the oldest messages beyond the window size or token budget"""
+        while len(self._messages) > 1 and (
+            len(self._messages) > HISTORY_WINDOW_MESSAGES or self._token_count > HISTORY_TOKEN_BUDGET
+        ):
+            dropped = self._messages.pop(0)
+            self._size_bytes -= self._message_bytes(dropped)
+            self._token_count -= estimate_tokens(dropped.content if isinstance(dropped.content, str) else str(dropped.content))
+            self.overflow_count += 1
+    
+    @staticmethod
+    def kept_count(newest_first: List[Any]) -> int:
+        """How many of the newest stored messages fit the prompt window, matching _trim_window"""
+        kept, tokens = 0, 0
+        for message in newest_first[:HISTORY_WINDOW_MESSAGES]:
+            tokens += estimate_tokens(message.content)
+            if kept >= 1 and tokens > HISTORY_TOKEN_BUDGET:
+                break
+            kept += 1
+        return kept
+    
+    def set_summary(self, summary: Optional[str]):
+        """Replace the rolling summary of older turns"""
+        self._summary = summary
     
     @property
     def messages(self):
         """Get messages (synchronous property)"""
+        if self._summary:
+            return [SystemMessage(content=f"Summary of the earlier conversation: {self._summary}")] + self._messages
         return self._messages
     
     def add_message(self, message):
         """Add message to history"""
-        self._messages.append(message)
+        self._append(message)
+        self._trim_window()
     
     def clear(self):
         """Clear message history"""
         self._messages = []
+        self._size_bytes = 0
+        self._token_count = 0
 
 class PrismaChatMemoryManager:
-    def __init__(self, db_manager: PrismaDatabaseManager):
+    def __init__(self, db_manager: PrismaDatabaseManager, summarizer=None):
         self.db_manager = db_manager
-        self.store = {}
+        self.message_writer = ChatMessageWriter(db_manager)
+        self.session_registry = ChatSessionRegistry(db_manager)
+        # async (previous_summary, messages) -> str, used to compact older turns
+        self.summarizer = summarizer
+        self._summary_tasks = {}
+        self.history_cache = SessionHistoryCache(
+            max_sessions=int(os.getenv("CHAT_HISTORY_CACHE_MAX_SESSIONS", "1000")),
+            max_bytes=int(os.getenv("CHAT_HISTORY_CACHE_MAX_BYTES", str(50 * 1024 * 1024))),
+            idle_ttl_seconds=float(os.getenv("CHAT_HISTORY_CACHE_TTL_SECONDS", "1800"))
+        )
     
     async def get_or_create_session(self, session_id: str = None, user_id: str = None) -> str:
         """Get existing session or create new one"""
-        await self.db_manager.ensure_connection()
-        
         if not session_id:
             session_id = str(uuid.uuid4())
         
         try:
-            existing_session = await self.db_manager.prisma.chatsession.find_unique(
-                where={"sessionId": session_id}
-            )
-            
-            if not existing_session:
-                await self.db_manager.prisma.chatsession.create(
-                    data={
-                        "sessionId": session_id,
-                        "userId": user_id,
-                        "createdAt": datetime.now(),
-                        "lastActivity": datetime.now(),
-                        "isActive": True
-                    }
-                )
-                logger.info(f"Created new chat session: {session_id}")
-            else:
-                await self.db_manager.prisma.chatsession.update(
-                    where={"sessionId": session_id},
-                    data={"lastActivity": datetime.now()}
-                )
-            
+            await self.session_registry.ensure_session(session_id, user_id)
             return session_id
             
         except Exception as e:
@@ -254,18 +469,104 @@ class PrismaChatMemoryManager:
             logger.error(f"Error saving message: {e}")
             raise
     
+    async def queue_message(self, session_id: str, role: str, content: str) -> str:
+        """Queue a message for write-behind persistence"""
+        return await self.message_writer.enqueue(session_id, role, content)
+    
     def get_session_history(self, session_id: str) -> PrismaChatMessageHistory:
         """Get chat message history for session"""
-        if session_id not in self.store:
-            self.store[session_id] = PrismaChatMessageHistory(session_id, self.db_manager)
-        return self.store[session_id]
+        history = self.history_cache.get(session_id)
+        if history is None:
+            # Loaded lazily from the database by _ensure_loaded
+            history = PrismaChatMessageHistory(session_id, self.db_manager)
+            self.history_cache.put(session_id, history)
+        return history
+    
+    def maybe_schedule_summary(self, session_id: str):
+        """Refresh the rolling summary in the background once enough turns left the window"""
+        history = self.history_cache.peek(session_id)
+        if (
+            self.summarizer is None
+            or history is None
+            or history.overflow_count < SUMMARY_REFRESH_MESSAGES
+            or session_id in self._summary_tasks
+        ):
+            return
+        
+        history.overflow_count = 0
+        task = asyncio.create_task(self.refresh_summary(session_id))
+        self._summary_tasks[session_id] = task
+        task.add_done_callback(lambda _: self._summary_tasks.pop(session_id, None))
+    
+    async def refresh_summary(self, session_id: str):
+        """Fold turns that no longer fit the prompt window into the session's rolling summary"""
+        await self.db_manager.ensure_connection()
+        try:
+            window = await self.db_manager.prisma.chatmessage.find_many(
+                where={"sessionId": session_id, "role": {"in": CHAT_ROLES}},
+                order=[{"timestamp": "desc"}],
+                take=HISTORY_WINDOW_MESSAGES
+            )
+            # Cut at the oldest message the prompt keeps: turns dropped by the token
+            # budget inside the window must be summarized too
+            kept = PrismaChatMessageHistory.kept_count(window)
+            if kept == len(window) and len(window) < HISTORY_WINDOW_MESSAGES:
+                return
+            
+            existing = await self.db_manager.prisma.chatmessage.find_unique(
+                where={"messageId": summary_message_id(session_id)}
+            )
+            timestamp_filter = {"lt": window[kept - 1].timestamp}
+            if existing:
+                timestamp_filter["gt"] = existing.timestamp
+            
+            older = await self.db_manager.prisma.chatmessage.find_many(
+                where={"sessionId": session_id, "role": {"in": CHAT_ROLES}, "timestamp": timestamp_filter},
+                order=[{"timestamp": "asc"}]
+            )
+            if not older:
+                return
+            
+            summary = await self.summarizer(existing.content if existing else "", older)
+            
+            # The summary row's timestamp marks the last message it covers
+            await self.db_manager.prisma.chatmessage.upsert(
+                where={"messageId": summary_message_id(session_id)},
+                data={
+                    "create": {
+                        "sessionId": session_id,
+                        "messageId": summary_message_id(session_id),
+                        "role": SUMMARY_ROLE,
+                        "content": summary,
+                        "timestamp": older[-1].timestamp
+                    },
+                    "update": {
+                        "content": summary,
+                        "timestamp": older[-1].timestamp
+                    }
+                }
+            )
+            
+            history = self.history_cache.peek(session_id)
+            if history is not None:
+                history.set_summary(summary)
+            logger.info(f"Refreshed summary for session {session_id} with {len(older)} messages")
+        except Exception as e:
+            logger.error(f"Error refreshing summary for session {session_id}: {e}")
+    
+    async def cancel_background_tasks(self):
+        """Cancel pending summary refreshes"""
+        tasks = list(self._summary_tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
     
     async def get_conversation_history(self, session_id: str, limit: int = 10) -> List[Dict]:
         """Get conversation history from database"""
         await self.db_manager.ensure_connection()
         try:
             messages = await self.db_manager.prisma.chatmessage.find_many(
-                where={"sessionId": session_id},
+                where={"sessionId": session_id, "role": {"in": CHAT_ROLES}},
                 order=[{"timestamp": "desc"}],
                 take=limit
             )
@@ -288,9 +589,12 @@ class PrismaChatMemoryManager:
         await self.db_manager.ensure_connection()
         
         try:
-            session = await self.db_manager.prisma.chatsession.find_unique(
-                where={"sessionId": session_id},
-                include={"messages": True}
+            # Count messages in the database instead of loading the conversation
+            session, message_count = await asyncio.gather(
+                self.db_manager.prisma.chatsession.find_unique(where={"sessionId": session_id}),
+                self.db_manager.prisma.chatmessage.count(
+                    where={"sessionId": session_id, "role": {"in": CHAT_ROLES}}
+                )
             )
             
             if session:
@@ -300,26 +604,92 @@ class PrismaChatMemoryManager:
                     "created_at": session.createdAt.isoformat(),
                     "last_activity": session.lastActivity.isoformat(),
                     "is_active": session.isActive,
-                    "message_count": len(session.messages)
+                    "message_count": message_count
                 }
             return None
         except Exception as e:
             logger.error(f"Error getting session info: {e}")
             return None
+    
+    async def count_messages(self, session_ids: List[str]) -> Dict[str, int]:
+        """Number of user/assistant messages per session, from one grouped query"""
+        if not session_ids:
+            return {}
+        rows = await self.db_manager.prisma.chatmessage.group_by(
+            by=["sessionId"],
+            where={"sessionId": {"in": session_ids}, "role": {"in": CHAT_ROLES}},
+            count=True
+        )
+        return {row["sessionId"]: row["_count"]["_all"] for row in rows}
+    
+    async def list_sessions(self, user_id: Optional[str], limit: int, cursor: Optional[str] = None):
+        """One page of active sessions ordered by lastActivity, and the cursor of the next page"""
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        await self.db_manager.ensure_connection()
+        
+        where_clause = {"isActive": True}
+        if user_id:
+            where_clause["userId"] = user_id
+        
+        # Fetch one extra row to know whether another page exists
+        page_args = {"cursor": {"sessionId": cursor}, "skip": 1} if cursor else {}
+        sessions = await self.db_manager.prisma.chatsession.find_many(
+            where=where_clause,
+            order=[{"lastActivity": "desc"}, {"sessionId": "desc"}],
+            take=limit + 1,
+            **page_args
+        )
+        next_cursor = sessions[limit - 1].sessionId if len(sessions) > limit else None
+        sessions = sessions[:limit]
+        
+        counts = await self.count_messages([session.sessionId for session in sessions])
+        return [
+            {
+                "session_id": session.sessionId,
+                "created_at": session.createdAt.isoformat(),
+                "last_activity": session.lastActivity.isoformat(),
+                "message_count": counts.get(session.sessionId, 0)
+            }
+            for session in sessions
+        ], next_cursor
 
 # Speech-to-Text processor class
 class SpeechToTextProcessor:
-    def __init__(self):
-        self.recognizer = sr.Recognizer()
-        self.google_api_key = os.getenv("GOOGLE_API_KEY")
+    def __init__(self, backend: ASRBackend = None):
+        self.max_upload_bytes = MAX_AUDIO_UPLOAD_BYTES
+        # Google Speech Recognition by default; ASR_BACKEND=whisper for local inference
+        self.backend = backend or build_asr_backend()
+        # Decoding webm/ogg/mp3/mp4 is CPU bound and runs in worker processes
+        self.transcode_pool = BoundedWorkerPool(
+            "transcode",
+            max_workers=int(os.getenv("AUDIO_TRANSCODE_WORKERS", str(min(4, os.cpu_count() or 1)))),
+            max_queue=int(os.getenv("AUDIO_TRANSCODE_MAX_QUEUE", "16")),
+            kind="process"
+        )
+        self.decode_timings = StageTimings()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.transcription_cache = TranscriptionCache(
+            max_entries=int(os.getenv("VOICE_TRANSCRIPTION_CACHE_SIZE", "500")),
+            ttl_seconds=float(os.getenv("VOICE_TRANSCRIPTION_CACHE_TTL_SECONDS", "3600"))
+        )
+        self.vad_clips = 0
+        self.vad_rejected_silent = 0
+        self.vad_seconds_in = 0.0
+        self.vad_seconds_out = 0.0
+    
+    async def read_upload(self, audio_file: UploadFile) -> bytes:
+        """Bytes of the upload; the request body was already capped while received (UploadCapRoute)"""
+        if audio_file.size is not None and audio_file.size > self.max_upload_bytes:
+            raise upload_too_large()
+        return await audio_file.read()
     
     async def process_audio_file(self, audio_file: UploadFile, language: str = "en-US") -> str:
         """Process uploaded audio file and convert to text"""
-        temp_audio_path = None
-        
         try:
-            # Read the uploaded file
-            audio_data = await audio_file.read()
+            # Read the uploaded file into memory
+            audio_data = await self.read_upload(audio_file)
             
             # Check if it's likely a WAV file by checking content type and filename
             filename = audio_file.filename or "audio.wav"
@@ -327,14 +697,30 @@ class SpeechToTextProcessor:
             
             logger.info(f"Processing audio file: {filename}, content_type: {content_type}, size: {len(audio_data)} bytes")
             
-            # Create temporary file with .wav extension for speech recognition
-            temp_audio_path = self._create_temp_file(audio_data, ".wav")
+            # The same recording is often sent again (retries, /chat/transcribe then /chat/voice)
+            raw_key = self.transcription_cache.key(audio_data, language)
+            cached = self.transcription_cache.get(raw_key)
+            if cached is not None:
+                return cached
             
-            # Perform speech recognition directly
-            transcribed_text = await self._speech_to_text(temp_audio_path, language)
+            start = time.perf_counter()
+            # Normalize to 16 kHz mono PCM, drop silence, then recognize from the in-memory buffer
+            pcm_wav = await self.transcode(audio_data, content_type)
+            pcm_key = raw_key if pcm_wav is audio_data else self.transcription_cache.key(pcm_wav, language)
+            cached = self.transcription_cache.get(pcm_key, normalized=True)
+            if cached is not None:
+                self.transcription_cache.put([raw_key], cached, time.perf_counter() - start)
+                return cached
+            
+            self.transcription_cache.misses += 1
+            speech_wav = await self.trim_silence(pcm_wav)
+            transcribed_text = await self._speech_to_text(speech_wav, language)
+            self.transcription_cache.put([raw_key, pcm_key], transcribed_text, time.perf_counter() - start)
             
             return transcribed_text
             
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error processing audio file: {e}")
             # Provide more helpful error messages
@@ -347,96 +733,76 @@ class SpeechToTextProcessor:
                 raise HTTPException(status_code=400, detail="No speech detected in audio. Please speak clearly and try again.")
             else:
                 raise HTTPException(status_code=500, detail="Audio processing failed. Please try recording again.")
-        
-        finally:
-            # Clean up temporary files safely
-            self._cleanup_temp_file(temp_audio_path)
     
-    def _create_temp_file(self, data: bytes, suffix: str) -> str:
-        """Create a temporary file with data"""
+    async def transcode(self, audio_bytes: bytes, content_type: str) -> bytes:
+        """Convert an upload to 16 kHz mono 16-bit PCM WAV on the transcoding process pool"""
+        if not audio_bytes:
+            raise HTTPException(status_code=400, detail="Audio file is empty")
+        
+        fmt = audio_format(content_type)
+        if fmt == "wav" and is_target_wav(audio_bytes):
+            return audio_bytes
+        
         try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
-                temp_file.write(data)
-                temp_file.flush()
-                os.fsync(temp_file.fileno())  # Ensure data is written to disk
-                return temp_file.name
+            pcm_wav, decode_seconds = await self.transcode_pool.run(transcode_to_pcm_wav, audio_bytes, fmt)
+        except WorkerPoolFull:
+            raise HTTPException(status_code=503, detail="Audio processing is busy. Please try again shortly.")
         except Exception as e:
-            logger.error(f"Error creating temporary file: {e}")
-            raise
+            logger.warning(f"Could not decode {fmt} audio: {e}")
+            raise HTTPException(status_code=400, detail=f"Could not decode {fmt} audio. Please try recording again.")
+        
+        self.decode_timings.observe(fmt, decode_seconds)
+        self.bytes_in += len(audio_bytes)
+        self.bytes_out += len(pcm_wav)
+        logger.info(f"Transcoded {fmt} audio: {len(audio_bytes)} -> {len(pcm_wav)} bytes in {decode_seconds * 1000:.1f}ms")
+        return pcm_wav
     
-    def _cleanup_temp_file(self, file_path: str) -> None:
-        """Safely clean up temporary file"""
-        if file_path and os.path.exists(file_path):
-            try:
-                os.unlink(file_path)
-            except (OSError, PermissionError) as e:
-                logger.warning(f"Could not delete temporary file {file_path}: {e}")
-                # Try again after a short delay
-                try:
-                    import time
-                    time.sleep(0.1)
-                    os.unlink(file_path)
-                except Exception:
-                    logger.warning(f"Failed to delete temporary file {file_path} after retry")
-    
-    async def _speech_to_text(self, audio_path: str, language: str) -> str:
-        """Convert audio to text using Google Speech Recognition"""
+    async def trim_silence(self, pcm_wav: bytes) -> bytes:
+        """Trim leading/trailing silence; silent uploads are rejected before recognition"""
+        speech_wav, details = await asyncio.to_thread(trim_silence, pcm_wav)
+        self.vad_clips += 1
+        self.vad_seconds_in += details["input_seconds"]
+        self.vad_seconds_out += details["output_seconds"]
+        if speech_wav is None:
+            self.vad_rejected_silent += 1
+            logger.info(f"No speech in {details['input_seconds']:.1f}s upload (noise floor {details['noise_floor_db']} dB)")
+            raise HTTPException(status_code=400, detail="No speech detected in audio. Please speak clearly and try again.")
+        return speech_wav
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "asr": self.backend.stats(),
+            "transcription_cache": self.transcription_cache.stats(),
+            "vad": {
+                "clips": self.vad_clips,
+                "rejected_silent": self.vad_rejected_silent,
+                "seconds_in": round(self.vad_seconds_in, 2),
+                "seconds_out": round(self.vad_seconds_out, 2)
+            },
+            "transcode_pool": self.transcode_pool.stats(),
+            "decode_timings": self.decode_timings.stats()["stages"],
+            "transcoded_bytes_in": self.bytes_in,
+            "transcoded_bytes_out": self.bytes_out
+        }
+    
+    async def _speech_to_text(self, audio_bytes: bytes, language: str) -> str:
+        """Convert PCM WAV audio to text with the configured ASR backend"""
+        if not audio_bytes:
+            raise HTTPException(status_code=400, detail="Audio file is empty")
+        
         try:
-            # Check if file exists and is readable
-            if not os.path.exists(audio_path):
-                raise HTTPException(status_code=500, detail="Audio file not found")
-            
-            # Check file size
-            file_size = os.path.getsize(audio_path)
-            logger.info(f"Processing audio file: {audio_path}, size: {file_size} bytes")
-            
-            if file_size == 0:
-                raise HTTPException(status_code=400, detail="Audio file is empty")
-            
-            # Try to read the audio file
-            try:
-                with sr.AudioFile(audio_path) as source:
-                    # Adjust for ambient noise
-                    self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
-                    # Record the audio
-                    audio_data = self.recognizer.record(source)
-                    logger.info("Audio data successfully loaded for recognition")
-            
-            except Exception as file_error:
-                logger.warning(f"AudioFile method failed: {file_error}")
-                raise HTTPException(
-                    status_code=400, 
-                    detail="Cannot read audio file. Please ensure the audio is in WAV format with proper encoding."
-                )
-            
-            # Use Google Speech Recognition API
-            if self.google_api_key:
-                try:
-                    text = self.recognizer.recognize_google(
-                        audio_data, 
-                        key=self.google_api_key,
-                        language=language
-                    )
-                    logger.info(f"Speech recognition successful (API): {len(text)} characters")
-                    return text
-                except sr.RequestError as e:
-                    logger.warning(f"Google Speech API error: {e}, falling back to free service")
-                except sr.UnknownValueError:
-                    raise HTTPException(status_code=400, detail="Could not understand the audio. Please speak clearly and try again.")
-            
-            # Fallback to free Google Speech Recognition
-            try:
-                text = self.recognizer.recognize_google(audio_data, language=language)
-                logger.info(f"Speech recognition successful (free): {len(text)} characters")
-                return text
-            except sr.UnknownValueError:
-                raise HTTPException(status_code=400, detail="Could not understand the audio. Please speak clearly and try again.")
-            except sr.RequestError as e:
-                logger.error(f"Speech recognition service error: {e}")
-                raise HTTPException(status_code=500, detail="Speech recognition service temporarily unavailable. Please try again.")
-                
-        except HTTPException:
-            raise
+            return await self.backend.transcribe(audio_bytes, language)
+        except UnreadableAudio:
+            raise HTTPException(
+                status_code=400, 
+                detail="Cannot read audio file. Please ensure the audio is in WAV format with proper encoding."
+            )
+        except UnrecognizedSpeech:
+            raise HTTPException(status_code=400, detail="Could not understand the audio. Please speak clearly and try again.")
+        except ASRServiceError:
+            raise HTTPException(status_code=500, detail="Speech recognition service temporarily unavailable. Please try again.")
+        except WorkerPoolFull:
+            raise HTTPException(status_code=503, detail="Speech recognition is busy. Please try again shortly.")
         except Exception as e:
             logger.error(f"Error in speech to text: {e}")
             raise HTTPException(status_code=500, detail="Speech recognition failed. Please try again.")
@@ -444,24 +810,32 @@ class SpeechToTextProcessor:
 # Updated Tourism Assistant using modern LangChain
 class TourismAssistant:
     def __init__(self):
-        # self.llm = ChatGoogleGenerativeAI(
-        #     model="gemini-1.5-flash-latest",
-        #     google_api_key=os.getenv("GOOGLE_API_KEY"),
-        #     temperature=0.7,
-        #     max_tokens=1000,
-        #     convert_system_message_to_human=True
-        # )
-        
-        self.llm=ChatGroq(
-            model="llama-3.3-70b-versatile",
-            groq_api_key=os.getenv("GROQ_API_KEY"),
-            temperature=0.7,
-            max_tokens=1000,
+        # Groq answers first; Gemini takes over when Groq is slow or failing
+        self.llm_router = LLMRouter(
+            self._build_llm_providers(),
+            initial_deadline=float(os.getenv("LLM_HEDGE_INITIAL_DEADLINE_SECONDS", "4.0")),
+            min_deadline=float(os.getenv("LLM_HEDGE_MIN_DEADLINE_SECONDS", "0.5")),
+            max_deadline=float(os.getenv("LLM_HEDGE_MAX_DEADLINE_SECONDS", "15.0")),
+            scheduler=llm_scheduler
         )
+        self.llm = RoutedChatModel(router=self.llm_router)
         
         self.knowledge_manager = KnowledgeBaseManager()
+        # Near-duplicate reuse is opt-in, e.g. CHAT_RESPONSE_CACHE_SIMILARITY=0.92
+        similarity = os.getenv("CHAT_RESPONSE_CACHE_SIMILARITY", "")
+        self.response_cache = ResponseCache(
+            embedder=self.knowledge_manager.embedder,
+            max_entries=int(os.getenv("CHAT_RESPONSE_CACHE_SIZE", "1000")),
+            ttl_seconds=float(os.getenv("CHAT_RESPONSE_CACHE_TTL_SECONDS", "3600")),
+            similarity_threshold=float(similarity) if similarity else None
+        )
+        self.idempotency = IdempotencyTable(
+            max_entries=int(os.getenv("CHAT_IDEMPOTENCY_MAX_KEYS", "10000")),
+            ttl_seconds=float(os.getenv("CHAT_IDEMPOTENCY_TTL_SECONDS", "3600"))
+        )
+        self.stage_timings = StageTimings()
         self.db_manager = PrismaDatabaseManager()
-        self.memory_manager = PrismaChatMemoryManager(self.db_manager)
+        self.memory_manager = PrismaChatMemoryManager(self.db_manager, summarizer=self._summarize_messages)
         self.speech_processor = SpeechToTextProcessor()
         
         # Create prompt template
@@ -471,29 +845,93 @@ class TourismAssistant:
             ("human", "{input}")
         ])
         
-        # Create the runnable chain
+        # Create the runnable chain once; the knowledge snippet is passed per call
+        # as the "knowledge_base" input variable
         self.chain = self.prompt_template | self.llm
         
-        # Create chain with message history
+        # Create chain with message history; each call passes the history object its
+        # turn already loaded, so an eviction from the history cache cannot swap it out
         self.chain_with_history = RunnableWithMessageHistory(
             self.chain,
-            self.get_session_history,
+            self._turn_history,
             input_messages_key="input",
             history_messages_key="history",
+            history_factory_config=[
+                ConfigurableFieldSpec(
+                    id="history",
+                    annotation=BaseChatMessageHistory,
+                    name="History",
+                    description="Chat history loaded for the turn",
+                    is_shared=True
+                )
+            ]
         )
     
     async def initialize(self):
         """Initialize the assistant"""
         await self.db_manager.connect()
+        self.memory_manager.message_writer.start()
+        self.memory_manager.session_registry.start()
+        self.speech_processor.transcode_pool.prestart()
+        self.speech_processor.backend.start()
     
     async def cleanup(self):
         """Cleanup resources"""
+        await self.memory_manager.cancel_background_tasks()
+        # Persist queued messages before the connection goes away
+        await self.memory_manager.message_writer.stop()
+        await self.memory_manager.session_registry.stop()
         await self.db_manager.disconnect()
+        self.speech_processor.backend.shutdown()
+        self.speech_processor.transcode_pool.shutdown()
     
     def get_session_history(self, session_id: str) -> BaseChatMessageHistory:
         """Get session history for RunnableWithMessageHistory"""
         return self.memory_manager.get_session_history(session_id)
     
+    @staticmethod
+    def _turn_history(history: BaseChatMessageHistory) -> BaseChatMessageHistory:
+        """History factory of the chain: the history passed in the call's config"""
+        return history
+    
+    def _build_llm_providers(self) -> List[Provider]:
+        """Chat model providers in the order given by LLM_PROVIDERS"""
+        factories = {
+            "groq": lambda: ChatGroq(
+                model="llama-3.3-70b-versatile",
+                groq_api_key=os.getenv("GROQ_API_KEY"),
+                temperature=0.7,
+                max_tokens=1000,
+            ),
+            "gemini": lambda: ChatGoogleGenerativeAI(
+                model="gemini-1.5-flash-latest",
+                google_api_key=os.getenv("GOOGLE_API_KEY"),
+                temperature=0.7,
+                max_tokens=1000,
+                convert_system_message_to_human=True
+            ),
+        }
+        required_keys = {"groq": "GROQ_API_KEY", "gemini": "GOOGLE_API_KEY"}
+        
+        providers = []
+        for name in os.getenv("LLM_PROVIDERS", "groq,gemini").split(","):
+            name = name.strip()
+            if name not in factories:
+                logger.warning(f"Unknown LLM provider '{name}' ignored")
+                continue
+            # Secondary providers are optional; skip them when not configured
+            if providers and not os.getenv(required_keys[name]):
+                continue
+            providers.append(Provider(
+                name,
+                factories[name](),
+                failure_threshold=int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5")),
+                reset_seconds=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+            ))
+        
+        logger.info(f"LLM providers: {[p.name for p in providers]}")
+        return providers
+    
     def _get_system_prompt(self) -> str:
         return """You are a helpful tourism assistant for N7awsou travel agency. Your role is to:
 
@@ -515,42 +953,124 @@ Always aim to make travel planning enjoyable and stress-free for users.
 Available Knowledge Base: {knowledge_base}
 """
     
-    async def get_response(self, message: str, session_id: str, user_id: str = None) -> Dict[str, Any]:
+    async def _summarize_messages(self, previous_summary: str, messages) -> str:
+        """Fold older conversation turns into a short rolling summary"""
+        transcript = "\n".join(f"{msg.role}: {msg.content}" for msg in messages)
+        prompt = f"""Update the summary of a conversation between a traveller and the N7awsou tourism assistant.
+Keep destinations, dates, budget, group size, preferences and any decisions made. Write in the language of the conversation, under 150 words, and return only the summary.
+
+Current summary:
+{previous_summary or "(none)"}
+
+New turns:
+{transcript}
+"""
+        response = await self.llm.ainvoke(prompt)
+        return response.content if hasattr(response, 'content') else str(response)
+    
+    async def _timed(self, stage: str, coro):
+        """Await coro, record its duration under stage and return (result, seconds)"""
+        start = time.perf_counter()
+        result = await coro
+        elapsed = time.perf_counter() - start
+        self.stage_timings.observe(stage, elapsed)
+        return result, elapsed
+    
+    async def _retrieve_knowledge(self, message: str):
+        return self.knowledge_manager.search(message, k=3)
+    
+    async def _prefetch_session(self, session_id: Optional[str], user_id: str = None, history_load=None):
+        """Register the session and load its history concurrently; returns (session_id, history, stage seconds).
+        
+        history_load is an already started _start_history_load task for the same session.
+        """
+        # A new session id is chosen here so its history needs no database load
+        new_session = not session_id
+        session_id = session_id or str(uuid.uuid4())
+        history = self.memory_manager.get_session_history(session_id)
+        if new_session:
+            history.mark_loaded()
+        
+        (_, session_seconds), (_, history_seconds) = await asyncio.gather(
+            self._timed("session", self.memory_manager.get_or_create_session(session_id, user_id)),
+            history_load if history_load is not None else self._timed("history", history._ensure_loaded())
+        )
+        return session_id, history, [session_seconds, history_seconds]
+    
+    def _start_history_load(self, session_id: Optional[str]) -> Optional[asyncio.Future]:
+        """Start loading an existing session's history (read only); None for a new session"""
+        if not session_id:
+            return None
+        history = self.memory_manager.get_session_history(session_id)
+        return asyncio.ensure_future(self._timed("history", history._ensure_loaded()))
+    
+    async def _prepare_turn(self, message: str, session_id: str, user_id: str = None, prefetch=None):
+        """Resolve the session, load its history and build the chain inputs for one turn.
+        
+        Session bookkeeping, history load and knowledge retrieval run concurrently;
+        prefetch is an already started _prefetch_session task (voice messages).
+        """
+        start = time.perf_counter()
+        if prefetch is None:
+            prefetch = self._prefetch_session(session_id, user_id)
+        (session_id, history, stage_seconds), (results, knowledge_seconds) = await asyncio.gather(
+            prefetch,
+            self._timed("knowledge", self._retrieve_knowledge(message))
+        )
+        wall = time.perf_counter() - start
+        self.stage_timings.observe("prepare", wall)
+        self.stage_timings.observe_overlap(stage_seconds + [knowledge_seconds], wall)
+        
+        knowledge_info = self.knowledge_manager.format_snippet(results)
+        
+        turn = {
+            "history": history,
+            "snippet_ids": tuple(r["id"] for r in results),
+            "user_id": user_id,
+            # Only context-free questions may be answered from the response cache
+            "first_turn": not history.messages
+        }
+        return session_id, {"input": message, "knowledge_base": knowledge_info}, turn
+    
+    def _cached_response(self, message: str, turn: Dict[str, Any]) -> Optional[str]:
+        """Cached answer for a first-turn question, recorded in the session history"""
+        if not turn["first_turn"]:
+            return None
+        cached = self.response_cache.get(message, turn["snippet_ids"], turn["user_id"])
+        if cached is not None:
+            turn["history"].add_message(HumanMessage(content=message))
+            turn["history"].add_message(AIMessage(content=cached))
+        return cached
+    
+    async def _finish_turn(self, session_id: str, message: str, response_content: str, turn: Dict[str, Any], cached: bool) -> str:
+        """Queue the turn for persistence and update the response cache"""
+        if turn["first_turn"] and not cached:
+            self.response_cache.put(message, turn["snippet_ids"], response_content, turn["user_id"])
+        
+        # Queue messages for write-behind persistence
+        await self.memory_manager.queue_message(session_id, "user", message)
+        message_id = await self.memory_manager.queue_message(session_id, "assistant", response_content)
+        self.memory_manager.maybe_schedule_summary(session_id)
+        return message_id
+    
+    async def get_response(self, message: str, session_id: str, user_id: str = None, prefetch=None) -> Dict[str, Any]:
         """Get AI response with memory and knowledge base"""
         try:
-            # Ensure session exists
-            session_id = await self.memory_manager.get_or_create_session(session_id, user_id)
+            session_id, chain_input, turn = await self._prepare_turn(message, session_id, user_id, prefetch)
             
-            # Load existing messages into history
-            history = self.memory_manager.get_session_history(session_id)
-            await history._ensure_loaded()
-            
-            # Get relevant knowledge base info
-            knowledge_info = self.knowledge_manager.get_relevant_info(message)
-            
-            # Update system prompt with knowledge
-            updated_prompt = self.prompt_template.partial(knowledge_base=knowledge_info)
-            updated_chain = updated_prompt | self.llm
-            
-            chain_with_history = RunnableWithMessageHistory(
-                updated_chain,
-                self.get_session_history,
-                input_messages_key="input",
-                history_messages_key="history",
-            )
-            
-            # Get AI response
-            response = await chain_with_history.ainvoke(
-                {"input": message},
-                config={"configurable": {"session_id": session_id}}
-            )
-            
-            # Extract content from AIMessage
-            response_content = response.content if hasattr(response, 'content') else str(response)
+            response_content = self._cached_response(message, turn)
+            cached = response_content is not None
+            if not cached:
+                # Get AI response
+                response, _ = await self._timed("llm", self.chain_with_history.ainvoke(
+                    chain_input,
+                    config={"configurable": {"history": turn["history"]}}
+                ))
+                
+                # Extract content from AIMessage
+                response_content = response.content if hasattr(response, 'content') else str(response)
             
-            # Save messages to database
-            await self.memory_manager.save_message(session_id, "user", message)
-            message_id = await self.memory_manager.save_message(session_id, "assistant", response_content)
+            message_id = await self._finish_turn(session_id, message, response_content, turn, cached)
             
             return {
                 "response": response_content,
@@ -559,15 +1079,69 @@ Available Knowledge Base: {knowledge_base}
                 "timestamp": datetime.now().isoformat()
             }
             
+        except LLMCapacityExceeded as e:
+            logger.warning(f"Chat request rejected: {e}")
+            raise HTTPException(
+                status_code=503,
+                detail="The assistant is busy, please retry shortly",
+                headers={"Retry-After": str(math.ceil(e.retry_after))}
+            )
         except Exception as e:
             logger.error(f"Error getting AI response: {e}")
             raise HTTPException(status_code=500, detail=f"AI processing error: {str(e)}")
     
+    async def bind_session(self, session_id: Optional[str], user_id: str = None):
+        """Resolve a session once for a long-lived connection; returns (session_id, history)"""
+        session_id, history, _ = await self._prefetch_session(session_id, user_id)
+        return session_id, history
+    
+    async def _bound_prefetch(self, session_id: str, history: PrismaChatMessageHistory):
+        """_prefetch_session result for a connection-bound session: no lookups, only an activity mark"""
+        self.memory_manager.session_registry.touch(session_id)
+        # Summaries and later lookups go through the cache, so keep the connection's copy there
+        if self.memory_manager.history_cache.peek(session_id) is not history:
+            self.memory_manager.history_cache.put(session_id, history)
+        return session_id, history, []
+    
+    async def stream_response(self, message: str, session_id: str, user_id: str = None, prefetch=None):
+        """Yield response tokens as the LLM emits them, then persist the turn"""
+        session_id, chain_input, turn = await self._prepare_turn(message, session_id, user_id, prefetch)
+        
+        cached_response = self._cached_response(message, turn)
+        if cached_response is not None:
+            response_chunks = [cached_response]
+            yield {"chunk": cached_response, "session_id": session_id}
+        else:
+            response_chunks = []
+            async for chunk in self.chain_with_history.astream(
+                chain_input,
+                config={"configurable": {"history": turn["history"]}}
+            ):
+                content = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                if content:
+                    response_chunks.append(content)
+                    yield {"chunk": content, "session_id": session_id}
+        
+        # Queue messages for persistence once the full reply is known
+        message_id = await self._finish_turn(session_id, message, "".join(response_chunks), turn, cached_response is not None)
+        
+        yield {
+            "done": True,
+            "session_id": session_id,
+            "message_id": message_id,
+            "timestamp": datetime.now().isoformat()
+        }
+    
     async def process_voice_message(self, audio_file: UploadFile, session_id: str = None, user_id: str = None, language: str = "en-US") -> Dict[str, Any]:
         """Process voice message and return both transcription and chat response"""
+        # History loads while the audio is transcribed; the session row is only
+        # created or touched once there is a message to answer
+        history_load = self._start_history_load(session_id)
         try:
             # Convert audio to text
-            transcribed_text = await self.speech_processor.process_audio_file(audio_file, language)
+            transcribed_text, _ = await self._timed(
+                "transcription", self.speech_processor.process_audio_file(audio_file, language)
+            )
             
             if not transcribed_text or transcribed_text.strip() == "":
                 raise HTTPException(status_code=400, detail="No speech detected in audio")
@@ -576,7 +1150,8 @@ Available Knowledge Base: {knowledge_base}
             chat_result = await self.get_response(
                 message=transcribed_text,
                 session_id=session_id,
-                user_id=user_id
+                user_id=user_id,
+                prefetch=self._prefetch_session(session_id, user_id, history_load)
             )
             
             return {
@@ -592,10 +1167,30 @@ Available Knowledge Base: {knowledge_base}
         except Exception as e:
             logger.error(f"Error processing voice message: {e}")
             raise HTTPException(status_code=500, detail=f"Voice processing error: {str(e)}")
+        finally:
+            # Also on cancellation (client disconnect); a finished load is unaffected
+            if history_load is not None:
+                history_load.cancel()
 
 # Rest of the code remains the same (global assistant, API routes, etc.)
 assistant = None
 
+async def cancel_on_disconnect(request: Request, coro, poll_seconds: float = 0.5):
+    """Await coro, cancelling it if the client disconnects before it finishes"""
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_seconds)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info(f"Client disconnected from {request.url.path}, cancelling")
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
+
 async def get_assistant():
     global assistant
     if assistant is None:
@@ -607,18 +1202,27 @@ async def get_assistant():
 @router.post("/chat", response_model=ChatResponse)
 async def chat(
     chat_request: ChatMessageRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_assistant: TourismAssistant = Depends(get_assistant)
 ):
     """Main chat endpoint with memory"""
     try:
-        result = await current_assistant.get_response(
-            message=chat_request.message,
-            session_id=chat_request.session_id,
-            user_id=chat_request.user_id
+        result = await current_assistant.idempotency.run(
+            f"chat:{idempotency_key}" if idempotency_key else None,
+            IdempotencyTable.fingerprint(chat_request.message, chat_request.session_id, chat_request.user_id),
+            lambda: current_assistant.get_response(
+                message=chat_request.message,
+                session_id=chat_request.session_id,
+                user_id=chat_request.user_id
+            )
         )
         
         return ChatResponse(**result)
         
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Chat error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -628,7 +1232,7 @@ async def chat(
 @router.get("/chat/history/{session_id}")
 async def get_chat_history(
     session_id: str,
-    limit: int = 20,
+    limit: int = Query(20, ge=1, le=100),
     current_assistant: TourismAssistant = Depends(get_assistant)
 ):
     """Get chat history for a session"""
@@ -666,8 +1270,8 @@ async def clear_session(
         await current_assistant.db_manager.ensure_connection()
         
         # Remove from memory cache
-        if session_id in current_assistant.memory_manager.memory_cache:
-            del current_assistant.memory_manager.memory_cache[session_id]
+        current_assistant.memory_manager.history_cache.pop(session_id)
+        current_assistant.memory_manager.session_registry.forget(session_id)
         
         # Mark session as inactive in database
         await current_assistant.db_manager.prisma.chatsession.update(
@@ -683,35 +1287,17 @@ async def clear_session(
 @router.get("/chat/sessions")
 async def get_user_sessions(
     user_id: str = None,
-    limit: int = 10,
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None,
     current_assistant: TourismAssistant = Depends(get_assistant)
 ):
-    """Get user's active sessions"""
+    """Get user's active sessions, most recently active first; pass next_cursor to get the next page"""
     try:
-        await current_assistant.db_manager.ensure_connection()
+        sessions, next_cursor = await current_assistant.memory_manager.list_sessions(user_id, limit, cursor)
         
-        where_clause = {"isActive": True}
-        if user_id:
-            where_clause["userId"] = user_id
-        
-        sessions = await current_assistant.db_manager.prisma.chatsession.find_many(
-            where=where_clause,
-            include={"messages": True},
-            
-            take=limit
-        )
-        
-        session_list = [
-            SessionInfo(
-                session_id=session.sessionId,
-                created_at=session.createdAt.isoformat(),
-                last_activity=session.lastActivity.isoformat(),
-                message_count=len(session.messages)
-            )
-            for session in sessions
-        ]
+        session_list = [SessionInfo(**session) for session in sessions]
         
-        return {"sessions": session_list}
+        return {"sessions": session_list, "next_cursor": next_cursor}
     except Exception as e:
         logger.error(f"Error getting sessions: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -719,35 +1305,59 @@ async def get_user_sessions(
 @router.post("/chat/stream")
 async def chat_stream(
     chat_request: ChatMessageRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_assistant: TourismAssistant = Depends(get_assistant)
 ):
-    """Streaming chat response"""
+    """Streaming chat response (server-sent events, one event per LLM token chunk)"""
+    idempotency = current_assistant.idempotency
+    key = f"stream:{idempotency_key}" if idempotency_key else None
+    fingerprint = IdempotencyTable.fingerprint(chat_request.message, chat_request.session_id, chat_request.user_id)
+    
+    async def replay_response(future):
+        # A retry of a turn that already ran: send the stored reply in one chunk
+        result = await asyncio.shield(future)
+        yield f"data: {json.dumps({'chunk': result['response'], 'session_id': result['session_id']})}\n\n"
+        yield f"data: {json.dumps({'done': True, 'session_id': result['session_id'], 'message_id': result['message_id'], 'timestamp': result['timestamp']})}\n\n"
+    
     async def generate_response():
         try:
-            result = await current_assistant.get_response(
-                message=chat_request.message,
-                session_id=chat_request.session_id,
-                user_id=chat_request.user_id
-            )
-            
-            # Simulate streaming by yielding response in chunks
-            response_text = result["response"]
-            chunk_size = 10
+            existing = idempotency.lookup(key, fingerprint) if key else None
+            if existing is not None:
+                async for line in replay_response(existing):
+                    yield line
+                return
             
-            for i in range(0, len(response_text), chunk_size):
-                chunk = response_text[i:i + chunk_size]
-                yield f"data: {json.dumps({'chunk': chunk, 'session_id': result['session_id']})}\n\n"
-                await asyncio.sleep(0.1)  # Small delay for streaming effect
-            
-            yield f"data: {json.dumps({'done': True, 'session_id': result['session_id']})}\n\n"
+            reserved = idempotency.reserve(key, fingerprint) if key else None
+            chunks = []
+            try:
+                async for event in current_assistant.stream_response(
+                    message=chat_request.message,
+                    session_id=chat_request.session_id,
+                    user_id=chat_request.user_id
+                ):
+                    if "chunk" in event:
+                        chunks.append(event["chunk"])
+                    elif event.get("done") and key:
+                        idempotency.complete(key, reserved, {"response": "".join(chunks), **{k: event[k] for k in ("session_id", "message_id", "timestamp")}})
+                    yield f"data: {json.dumps(event)}\n\n"
+            except BaseException as e:
+                if key:
+                    idempotency.fail(key, reserved, e if isinstance(e, Exception) else asyncio.CancelledError())
+                raise
             
+        except IdempotencyConflict as e:
+            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+        except LLMCapacityExceeded as e:
+            logger.warning(f"Chat stream rejected: {e}")
+            yield f"data: {json.dumps({'error': 'The assistant is busy, please retry shortly', 'retry_after': math.ceil(e.retry_after)})}\n\n"
         except Exception as e:
+            logger.error(f"Chat stream error: {e}")
             yield f"data: {json.dumps({'error': str(e)})}\n\n"
     
     return StreamingResponse(
         generate_response(),
-        media_type="text/plain",
-        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"}
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive", "X-Accel-Buffering": "no"}
     )
 
 # Cleanup on app shutdown
@@ -757,164 +1367,46 @@ async def shutdown_event():
     if assistant:
         await assistant.cleanup()
 
-@router.get("/chat/history/{session_id}")
-async def get_chat_history(
-    session_id: str,
-    limit: int = 20,
-    current_assistant: TourismAssistant = Depends(get_assistant)
-):
-    """Get chat history for a session"""
-    try:
-        history = await current_assistant.memory_manager.get_conversation_history(session_id, limit)
-        return {"session_id": session_id, "history": history}
-    except Exception as e:
-        logger.error(f"Error getting history: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-@router.get("/chat/session/{session_id}")
-async def get_session_info(
-    session_id: str,
-    current_assistant: TourismAssistant = Depends(get_assistant)
-):
-    """Get session information"""
-    try:
-        session_info = await current_assistant.memory_manager.get_session_info(session_id)
-        if not session_info:
-            raise HTTPException(status_code=404, detail="Session not found")
-        return session_info
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error getting session info: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-@router.delete("/chat/session/{session_id}")
-async def clear_session(
-    session_id: str,
-    current_assistant: TourismAssistant = Depends(get_assistant)
-):
-    """Clear a chat session"""
-    try:
-        await current_assistant.db_manager.ensure_connection()
-        
-        # Remove from memory cache
-        if session_id in current_assistant.memory_manager.memory_cache:
-            del current_assistant.memory_manager.memory_cache[session_id]
-        
-        # Mark session as inactive in database
-        await current_assistant.db_manager.prisma.chatsession.update(
-            where={"sessionId": session_id},
-            data={"isActive": False}
-        )
-        
-        return {"message": "Session cleared successfully"}
-    except Exception as e:
-        logger.error(f"Error clearing session: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-@router.get("/chat/sessions")
-async def get_user_sessions(
-    user_id: str = None,
-    limit: int = 10,
-    current_assistant: TourismAssistant = Depends(get_assistant)
-):
-    """Get user's active sessions"""
-    try:
-        await current_assistant.db_manager.ensure_connection()
-        
-        where_clause = {"isActive": True}
-        if user_id:
-            where_clause["userId"] = user_id
-        
-        sessions = await current_assistant.db_manager.prisma.chatsession.find_many(
-            where=where_clause,
-            include={"messages": True},
-            
-            take=limit
-        )
-        
-        session_list = [
-            SessionInfo(
-                session_id=session.sessionId,
-                created_at=session.createdAt.isoformat(),
-                last_activity=session.lastActivity.isoformat(),
-                message_count=len(session.messages)
-            )
-            for session in sessions
-        ]
-        
-        return {"sessions": session_list}
-    except Exception as e:
-        logger.error(f"Error getting sessions: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-@router.post("/chat/stream")
-async def chat_stream(
-    chat_request: ChatMessageRequest,
-    current_assistant: TourismAssistant = Depends(get_assistant)
-):
-    """Streaming chat response"""
-    async def generate_response():
-        try:
-            result = await current_assistant.get_response(
-                message=chat_request.message,
-                session_id=chat_request.session_id,
-                user_id=chat_request.user_id
-            )
-            
-            # Simulate streaming by yielding response in chunks
-            response_text = result["response"]
-            chunk_size = 10
-            
-            for i in range(0, len(response_text), chunk_size):
-                chunk = response_text[i:i + chunk_size]
-                yield f"data: {json.dumps({'chunk': chunk, 'session_id': result['session_id']})}\n\n"
-                await asyncio.sleep(0.1)  # Small delay for streaming effect
-            
-            yield f"data: {json.dumps({'done': True, 'session_id': result['session_id']})}\n\n"
-            
-        except Exception as e:
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
-    
-    return StreamingResponse(
-        generate_response(),
-        media_type="text/plain",
-        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"}
-    )
-
 @router.post("/chat/voice", response_model=VoiceChatResponse)
 async def voice_chat(
+    request: Request,
     audio_file: UploadFile = File(...),
     session_id: Optional[str] = None,
     user_id: Optional[str] = None,
     language: Optional[str] = "en-US",
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_assistant: TourismAssistant = Depends(get_assistant)
 ):
     """Voice chat endpoint - accepts audio file and returns transcription + chat response"""
     try:
         # Validate file type
         allowed_types = ['audio/wav', 'audio/mpeg', 'audio/mp4', 'audio/ogg', 'audio/webm']
-        if audio_file.content_type not in allowed_types:
+        if (audio_file.content_type or "").split(";")[0].strip() not in allowed_types:
             raise HTTPException(
                 status_code=400, 
                 detail=f"Unsupported audio format. Allowed: {', '.join(allowed_types)}"
             )
         
-        # Check file size (limit to 10MB)
-        max_size = 10 * 1024 * 1024  # 10MB
-        if audio_file.size and audio_file.size > max_size:
-            raise HTTPException(status_code=400, detail="Audio file too large. Maximum size: 10MB")
-        
-        # Process the voice message
-        result = await current_assistant.process_voice_message(
-            audio_file=audio_file,
-            session_id=session_id,
-            user_id=user_id,
-            language=language
-        )
+        # The body was capped while received; the file itself must also fit the cap
+        if audio_file.size and audio_file.size > MAX_AUDIO_UPLOAD_BYTES:
+            raise upload_too_large()
+        
+        # Process the voice message; a keyed turn keeps running for the client's retry
+        result = await cancel_on_disconnect(request, current_assistant.idempotency.run(
+            f"voice:{idempotency_key}" if idempotency_key else None,
+            IdempotencyTable.fingerprint(audio_file.filename, audio_file.size, session_id, user_id, language),
+            lambda: current_assistant.process_voice_message(
+                audio_file=audio_file,
+                session_id=session_id,
+                user_id=user_id,
+                language=language
+            )
+        ))
         
         return VoiceChatResponse(**result)
         
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
@@ -923,6 +1415,7 @@ async def voice_chat(
 
 @router.post("/chat/transcribe")
 async def transcribe_audio(
+    request: Request,
     audio_file: UploadFile = File(...),
     language: Optional[str] = "en-US",
     current_assistant: TourismAssistant = Depends(get_assistant)
@@ -931,14 +1424,16 @@ async def transcribe_audio(
     try:
         # Validate file type
         allowed_types = ['audio/wav', 'audio/mpeg', 'audio/mp4', 'audio/ogg', 'audio/webm']
-        if audio_file.content_type not in allowed_types:
+        if (audio_file.content_type or "").split(";")[0].strip() not in allowed_types:
             raise HTTPException(
                 status_code=400, 
                 detail=f"Unsupported audio format. Allowed: {', '.join(allowed_types)}"
             )
         
         # Transcribe audio
-        transcribed_text = await current_assistant.speech_processor.process_audio_file(audio_file, language)
+        transcribed_text = await cancel_on_disconnect(
+            request, current_assistant.speech_processor.process_audio_file(audio_file, language)
+        )
         
         return {
             "transcribed_text": transcribed_text,
@@ -951,6 +1446,249 @@ async def transcribe_audio(
         logger.error(f"Transcription error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     
+@router.post("/chat/knowledge/reload")
+async def reload_knowledge_base(current_assistant: TourismAssistant = Depends(get_assistant)):
+    """Re-index the knowledge base files"""
+    current_assistant.knowledge_manager.load_knowledge_base()
+    return {"passages": len(current_assistant.knowledge_manager.passages)}
+
+@router.get("/chat/metrics")
+async def chat_metrics(current_assistant: TourismAssistant = Depends(get_assistant)):
+    """In-process cache metrics for the chat assistant"""
+    return {
+        "history_cache": current_assistant.memory_manager.history_cache.stats(),
+        "message_writer": current_assistant.memory_manager.message_writer.stats(),
+        "session_registry": current_assistant.memory_manager.session_registry.stats(),
+        "response_cache": current_assistant.response_cache.stats(),
+        "llm_router": current_assistant.llm_router.stats(),
+        "llm_scheduler": llm_scheduler.stats(),
+        "idempotency": current_assistant.idempotency.stats(),
+        "stage_timings": current_assistant.stage_timings.stats(),
+        "speech": current_assistant.speech_processor.stats()
+    }
+
+# Voice WebSocket: audio arrives as 16 kHz mono 16-bit PCM frames
+VOICE_WS_SAMPLE_RATE = 16000
+VOICE_WS_PARTIAL_SECONDS = float(os.getenv("VOICE_WS_PARTIAL_SECONDS", "1.0"))
+VOICE_WS_ENDPOINT_SILENCE_MS = int(os.getenv("VOICE_WS_ENDPOINT_SILENCE_MS", "600"))
+VOICE_WS_MAX_UTTERANCE_SECONDS = float(os.getenv("VOICE_WS_MAX_UTTERANCE_SECONDS", "60"))
+# "auto" sends partial transcripts only with a local ASR backend; "on" / "off" force it
+VOICE_WS_PARTIALS = os.getenv("VOICE_WS_PARTIALS", "auto").lower()
+
+async def ws_send(websocket: WebSocket, message: Dict[str, Any]):
+    """Send a JSON message, raising WebSocketDisconnect if the socket is gone"""
+    try:
+        await websocket.send_json(message)
+    except WebSocketDisconnect:
+        raise
+    except Exception as e:
+        # Sending on a closed socket raises RuntimeError/OSError; report it as the disconnect it is
+        raise WebSocketDisconnect(code=1006) from e
+
+async def stream_ws_reply(
+    websocket: WebSocket,
+    current_assistant: TourismAssistant,
+    message: str,
+    session_id: str,
+    user_id: Optional[str],
+    history: PrismaChatMessageHistory,
+    reply_to: Any = None
+):
+    """Push one streamed reply for a connection-bound session as token/done/error messages.
+    
+    Raises WebSocketDisconnect once the socket can no longer be written to.
+    """
+    tag = {"reply_to": reply_to} if reply_to is not None else {}
+    
+    try:
+        async for event in current_assistant.stream_response(
+            message, session_id, user_id,
+            prefetch=current_assistant._bound_prefetch(session_id, history)
+        ):
+            if event.get("done"):
+                await ws_send(websocket, {"type": "done", **tag, **event})
+            else:
+                await ws_send(websocket, {"type": "token", **tag, "chunk": event["chunk"]})
+    except LLMCapacityExceeded as e:
+        await ws_send(websocket, {"type": "error", **tag, "status": 503, "detail": "The assistant is busy, please retry shortly", "retry_after": math.ceil(e.retry_after)})
+    except (asyncio.CancelledError, WebSocketDisconnect):
+        raise
+    except Exception as e:
+        logger.error(f"WebSocket reply error: {e}")
+        await ws_send(websocket, {"type": "error", **tag, "status": 500, "detail": str(e)})
+
+@router.websocket("/chat/voice/ws")
+async def voice_chat_ws(
+    websocket: WebSocket,
+    session_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    language: Optional[str] = "en-US",
+    current_assistant: TourismAssistant = Depends(get_assistant)
+):
+    """Voice chat over a WebSocket with partial transcripts and a streamed reply.
+    
+    Client -> server: binary frames of 16 kHz mono 16-bit PCM while the user speaks;
+    {"type": "end"} closes the utterance early (otherwise trailing silence does).
+    Server -> client: ready, partial, transcript, token, done and error JSON messages.
+    Partials transcribe only the audio since the previous partial and are sent
+    with local backends unless VOICE_WS_PARTIALS says otherwise.
+    """
+    await websocket.accept()
+    speech = current_assistant.speech_processor
+    utterance = UtteranceBuffer(VOICE_WS_SAMPLE_RATE, VOICE_WS_ENDPOINT_SILENCE_MS)
+    partial_task = None
+    partial_text = ""
+    partials = VOICE_WS_PARTIALS == "on" or (VOICE_WS_PARTIALS == "auto" and speech.backend.local)
+    
+    # Session row and history window stay bound to the connection
+    session_id, history = await current_assistant.bind_session(session_id, user_id)
+    await websocket.send_json({"type": "ready", "session_id": session_id})
+    
+    async def send_partial(wav: bytes):
+        nonlocal partial_text
+        try:
+            speech_wav, _ = await asyncio.to_thread(trim_silence, wav)
+            if speech_wav is not None:
+                text = await speech.backend.transcribe(speech_wav, language)
+                partial_text = f"{partial_text} {text}".strip()
+                await ws_send(websocket, {"type": "partial", "text": partial_text})
+        except asyncio.CancelledError:
+            raise
+        except WebSocketDisconnect:
+            # The receive loop sees the disconnect and closes the connection
+            pass
+        except Exception as e:
+            # Partial transcripts are best effort; the final one reports errors
+            logger.debug(f"Partial transcription skipped: {e}")
+    
+    async def finish_utterance():
+        nonlocal partial_task, partial_text
+        if partial_task is not None:
+            partial_task.cancel()
+            partial_task = None
+        partial_text = ""
+        wav = utterance.to_wav()
+        utterance.clear()
+        
+        try:
+            speech_wav = await speech.trim_silence(wav)
+            text, _ = await current_assistant._timed("transcription", speech._speech_to_text(speech_wav, language))
+        except HTTPException as e:
+            await ws_send(websocket, {"type": "error", "status": e.status_code, "detail": e.detail})
+            return
+        await ws_send(websocket, {"type": "transcript", "text": text})
+        await stream_ws_reply(websocket, current_assistant, text, session_id, user_id, history)
+    
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            
+            if message.get("bytes"):
+                utterance.append(message["bytes"])
+                if utterance.seconds >= VOICE_WS_MAX_UTTERANCE_SECONDS:
+                    await finish_utterance()
+                elif utterance.due_for_check(VOICE_WS_PARTIAL_SECONDS):
+                    if await asyncio.to_thread(utterance.speech_ended):
+                        await finish_utterance()
+                    elif partials and (partial_task is None or partial_task.done()):
+                        # One partial transcription in flight per connection
+                        partial_task = asyncio.create_task(send_partial(utterance.take_partial_wav()))
+            elif message.get("text"):
+                try:
+                    control = json.loads(message["text"])
+                except ValueError:
+                    control = {}
+                if not isinstance(control, dict):
+                    control = {}
+                if control.get("type") == "end" and utterance.pcm:
+                    await finish_utterance()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if partial_task is not None:
+            partial_task.cancel()
+            await asyncio.gather(partial_task, return_exceptions=True)
+        logger.info(f"Voice WebSocket closed for session {session_id}")
+
+CHAT_WS_MAX_PENDING = int(os.getenv("CHAT_WS_MAX_PENDING", "8"))
+
+@router.websocket("/chat/ws")
+async def chat_ws(
+    websocket: WebSocket,
+    session_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    current_assistant: TourismAssistant = Depends(get_assistant)
+):
+    """Text chat over a WebSocket bound to one session.
+    
+    The session is resolved once on connect and its history window is kept for the
+    connection, so each message only pays for retrieval and the LLM call; turns are
+    persisted through the write-behind queue as with /chat.
+    Client -> server: {"type": "message", "message": "...", "id": optional}, {"type": "ping"}.
+    Server -> client: ready, token, done, error and pong JSON messages; replies carry
+    the message id as reply_to and are sent in the order messages arrived.
+    """
+    await websocket.accept()
+    session_id, history = await current_assistant.bind_session(session_id, user_id)
+    await websocket.send_json({"type": "ready", "session_id": session_id})
+    
+    # Turns run one at a time: each reply needs the previous one in the history window
+    pending = asyncio.Queue(maxsize=CHAT_WS_MAX_PENDING)
+    
+    async def reply_worker():
+        try:
+            while True:
+                message, reply_to = await pending.get()
+                await stream_ws_reply(websocket, current_assistant, message, session_id, user_id, history, reply_to)
+        except WebSocketDisconnect:
+            pass
+    
+    worker = asyncio.create_task(reply_worker())
+    try:
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                break
+            if frame.get("text") is None:
+                await websocket.send_json({"type": "error", "status": 400, "detail": "Messages must be JSON text frames"})
+                continue
+            try:
+                incoming = json.loads(frame["text"])
+            except ValueError:
+                await websocket.send_json({"type": "error", "status": 400, "detail": "Messages must be JSON"})
+                continue
+            if not isinstance(incoming, dict):
+                incoming = {}
+            
+            if incoming.get("type") == "ping":
+                await websocket.send_json({"type": "pong"})
+                continue
+            
+            reply_to = incoming.get("id")
+            try:
+                chat_request = ChatMessageRequest(message=incoming.get("message"), session_id=session_id, user_id=user_id)
+            except ValidationError as e:
+                await websocket.send_json({"type": "error", "reply_to": reply_to, "status": 422, "detail": e.errors()[0]["msg"]})
+                continue
+            try:
+                pending.put_nowait((chat_request.message, reply_to))
+            except asyncio.QueueFull:
+                await websocket.send_json({"type": "error", "reply_to": reply_to, "status": 429, "detail": "Too many messages awaiting a reply"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # A reply cut off by the disconnect is not persisted, like an aborted /chat/stream
+        worker.cancel()
+        try:
+            await worker
+        except (asyncio.CancelledError, WebSocketDisconnect):
+            pass
+        except Exception as e:
+            logger.error(f"Chat WebSocket reply worker failed: {e}")
+        logger.info(f"Chat WebSocket closed for session {session_id}")
+
 @router.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Request, HTTPException
 import google.generativeai as genai
 import os
 import json
+import math
 import re
 
+from services.llm_scheduler import LLMCapacityExceeded, estimate_prompt_tokens, llm_scheduler, response_tokens
+
 router = APIRouter()
 api_keyyy=os.getenv("GOOGLE_API_KEY")
 
@@ -73,7 +76,16 @@ Important Instructions:
 Remember: Match the user's language exactly - if they write in Arabic, respond in Arabic; if in French, respond in French; if in English, respond in English.
 """
 
-    response = model.generate_content(prompt)
+    try:
+        async with llm_scheduler.slot("gemini", estimate_prompt_tokens(prompt, 2000)) as reservation:
+            response = await model.generate_content_async(prompt)
+            reservation.record(response_tokens(response))
+    except LLMCapacityExceeded as e:
+        raise HTTPException(
+            status_code=503,
+            detail="The planner is busy, please retry shortly",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
     
     # Enhanced text cleaning
     cleaned_text = response.text
@@ -1,11 +1,18 @@
 from fastapi import APIRouter, Query, HTTPException
-from typing import Optional
+from pydantic import BaseModel
+from typing import List, Literal, Optional
+from datetime import datetime
+from functools import wraps
+import sys
+import time
 import pandas as pd
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 import asyncio
+from collections import OrderedDict, deque
 from generated.prisma import Prisma
+from services.latency_stats import summarize_ms
 import logging
 
 # Set up logging
@@ -26,16 +33,128 @@ offers_df = None
 interactions_df = None
 user_offer_matrix = None
 popularity_scores = None
+user_interactions = {}
 is_initialized = False
 
+# Interaction events buffered for bulk writes to History
+EVENT_INTERACTION_WEIGHTS = {"view": 1, "click": 2, "enroll": 3}
+ENROLLMENT_BONUS = 5
+MAX_EVENTS_PER_REQUEST = 5000
+EVENT_QUEUE_MAX_SIZE = 50000
+EVENT_FLUSH_BATCH_SIZE = 2000
+EVENT_FLUSH_INTERVAL_SECONDS = 2.0
+KNOWN_USERS_MAX_SIZE = 100000
+KNOWN_USERS_TTL_SECONDS = 3600
+
+event_queue = None
+event_flusher_task = None
+# History chunks whose write failed, retried on the next flush
+event_retry_chunks = deque()
+event_rows_dropped = 0
+# Events whose user could not be confirmed yet (database unavailable)
+event_unconfirmed = deque()
+event_rows_unknown_user = 0
+
+# Model build bookkeeping for introspection
+model_generation = 0
+model_built_at = None
+model_stage_seconds = {}
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram in milliseconds, with percentiles over recent requests"""
+    BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+    
+    def __init__(self, window: int = 1000):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.total_ms = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+    
+    def observe(self, seconds: float):
+        value_ms = seconds * 1000
+        self.total_ms += value_ms
+        self.count += 1
+        self.recent.append(seconds)
+        for i, bound in enumerate(self.BUCKETS_MS):
+            if value_ms <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+    
+    def snapshot(self) -> dict:
+        labels = [f"le_{bound}ms" for bound in self.BUCKETS_MS] + ["inf"]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            **summarize_ms(self.recent, (0.5, 0.95, 0.99), digits=3),
+            "buckets": dict(zip(labels, self.counts))
+        }
+
+route_latencies = {}
+
+class KnownUsers:
+    """User ids confirmed to exist, bounded in size and confirmed again after a TTL"""
+    
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._confirmed = OrderedDict()  # user_id -> confirmation time
+    
+    def __contains__(self, user_id: int) -> bool:
+        confirmed_at = self._confirmed.get(user_id)
+        if confirmed_at is None:
+            return False
+        if time.monotonic() - confirmed_at > self.ttl_seconds:
+            del self._confirmed[user_id]
+            return False
+        return True
+    
+    def __len__(self) -> int:
+        return len(self._confirmed)
+    
+    def add(self, user_ids):
+        now = time.monotonic()
+        for user_id in user_ids:
+            self._confirmed[user_id] = now
+            self._confirmed.move_to_end(user_id)
+        while len(self._confirmed) > self.max_size:
+            self._confirmed.popitem(last=False)
+
+# Users seen to exist, so events only reference valid users (History has a foreign key on userId)
+known_users = KnownUsers(KNOWN_USERS_MAX_SIZE, KNOWN_USERS_TTL_SECONDS)
+
+def timed_route(name: str):
+    """Record the latency of a route handler under the given name"""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                route_latencies.setdefault(name, LatencyHistogram()).observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+class InteractionEvent(BaseModel):
+    user_id: int
+    offer_id: int
+    type: Literal["view", "click", "enroll"]
+    timestamp: Optional[datetime] = None
+
+class InteractionEventBatch(BaseModel):
+    events: List[InteractionEvent]
+
 async def initialize_recommendation_system():
     """Initialize the recommendation system with data from database"""
-    global tfidf, content_matrix, content_similarity, offers_df, interactions_df, user_offer_matrix, popularity_scores, is_initialized
+    global offers_df, interactions_df, user_offer_matrix, popularity_scores, user_interactions, is_initialized
     
     if is_initialized:
         return
     
     try:
+        load_stage_seconds = {}
+        stage_start = time.perf_counter()
         logger.info("Connecting to database...")
         # Connect to database if not already connected
         if not prisma.is_connected():
@@ -76,6 +195,8 @@ async def initialize_recommendation_system():
         
         offers_df = pd.DataFrame(offers_data)
         logger.info(f"Created offers DataFrame with {len(offers_df)} rows")
+        load_stage_seconds['load_tours'] = time.perf_counter() - stage_start
+        stage_start = time.perf_counter()
         
         # Fetch interactions (History) from database
         logger.info("Loading history from database...")
@@ -95,51 +216,11 @@ async def initialize_recommendation_system():
         
         interactions_df = pd.DataFrame(interactions_data)
         logger.info(f"Created interactions DataFrame with {len(interactions_df)} rows")
+        load_stage_seconds['load_history'] = time.perf_counter() - stage_start
         
         # Initialize recommendation models
-        if len(offers_df) > 0:
-            # Content Vectorization
-            logger.info("Building content similarity matrix...")
-            offers_df['content'] = (
-                offers_df['destinationLocation'].fillna('') + " " + 
-                offers_df['tags'].fillna('') + " " + 
-                offers_df['description'].fillna('') + " " +
-                offers_df['category'].fillna('')
-            )
-            
-            tfidf = TfidfVectorizer(stop_words='english', max_features=5000)
-            content_matrix = tfidf.fit_transform(offers_df['content'])
-            content_similarity = cosine_similarity(content_matrix)
-            logger.info("Content similarity matrix created")
-        
-        # Collaborative Filtering
-        if len(interactions_df) > 0:
-            logger.info("Building collaborative filtering matrix...")
-            user_offer_matrix = interactions_df.pivot_table(
-                index='user_id', 
-                columns='offer_id', 
-                values='interaction'
-            ).fillna(0)
-            
-            # Popularity score (based on total interaction + enrollment bonus)
-            popularity_scores = {}
-            for _, interaction in interactions_df.iterrows():
-                offer_id = interaction['offer_id']
-                score = interaction['interaction']
-                # Give bonus for enrollment
-                if interaction['enrolled']:
-                    score += 5
-                
-                if offer_id in popularity_scores:
-                    popularity_scores[offer_id] += score
-                else:
-                    popularity_scores[offer_id] = score
-            
-            logger.info(f"Created popularity scores for {len(popularity_scores)} tours")
-        else:
-            user_offer_matrix = pd.DataFrame()
-            popularity_scores = {}
-            logger.info("No interactions found, using empty collaborative filtering")
+        build_recommendation_models(offers_df, interactions_df)
+        model_stage_seconds.update(load_stage_seconds)
         
         is_initialized = True
         logger.info(f"Recommendation system initialized successfully with {len(offers_df)} tours and {len(interactions_df)} interactions")
@@ -152,6 +233,81 @@ async def initialize_recommendation_system():
         interactions_df = pd.DataFrame()
         user_offer_matrix = pd.DataFrame()
         popularity_scores = {}
+        user_interactions = {}
+
+def build_recommendation_models(offers: pd.DataFrame, interactions: pd.DataFrame):
+    """Build the recommendation models from offers and interactions frames"""
+    global tfidf, content_matrix, content_similarity, offers_df, interactions_df, user_offer_matrix, popularity_scores, user_interactions
+    global model_generation, model_built_at, model_stage_seconds
+    
+    offers_df = offers
+    interactions_df = interactions
+    stage_seconds = {}
+    
+    if len(offers_df) > 0:
+        # Content Vectorization
+        logger.info("Building content similarity matrix...")
+        stage_start = time.perf_counter()
+        offers_df['content'] = (
+            offers_df['destinationLocation'].fillna('') + " " + 
+            offers_df['tags'].fillna('') + " " + 
+            offers_df['description'].fillna('') + " " +
+            offers_df['category'].fillna('')
+        )
+        
+        tfidf = TfidfVectorizer(stop_words='english', max_features=5000)
+        content_matrix = tfidf.fit_transform(offers_df['content'])
+        stage_seconds['content_vectorization'] = time.perf_counter() - stage_start
+        stage_start = time.perf_counter()
+        content_similarity = cosine_similarity(content_matrix)
+        stage_seconds['content_similarity'] = time.perf_counter() - stage_start
+        logger.info("Content similarity matrix created")
+    
+    # Collaborative Filtering
+    if len(interactions_df) > 0:
+        logger.info("Building collaborative filtering matrix...")
+        stage_start = time.perf_counter()
+        user_offer_matrix = interactions_df.pivot_table(
+            index='user_id', 
+            columns='offer_id', 
+            values='interaction'
+        ).fillna(0)
+        stage_seconds['collaborative_matrix'] = time.perf_counter() - stage_start
+        stage_start = time.perf_counter()
+        
+        # Popularity score (based on total interaction + enrollment bonus)
+        popularity_scores = {}
+        for _, interaction in interactions_df.iterrows():
+            offer_id = interaction['offer_id']
+            score = interaction['interaction']
+            # Give bonus for enrollment
+            if interaction['enrolled']:
+                score += 5
+            
+            if offer_id in popularity_scores:
+                popularity_scores[offer_id] += score
+            else:
+                popularity_scores[offer_id] = score
+        
+        logger.info(f"Created popularity scores for {len(popularity_scores)} tours")
+        stage_seconds['popularity_scores'] = time.perf_counter() - stage_start
+        stage_start = time.perf_counter()
+        
+        # Per-user index of interacted offers
+        user_interactions = {
+            user_id: set(offer_ids)
+            for user_id, offer_ids in interactions_df.groupby('user_id')['offer_id']
+        }
+        stage_seconds['user_index'] = time.perf_counter() - stage_start
+    else:
+        user_offer_matrix = pd.DataFrame()
+        popularity_scores = {}
+        user_interactions = {}
+        logger.info("No interactions found, using empty collaborative filtering")
+    
+    model_generation += 1
+    model_built_at = datetime.now()
+    model_stage_seconds = stage_seconds
 
 def get_user_collaborative_scores(user_id: int):
     """Get collaborative filtering scores for a user"""
@@ -174,11 +330,180 @@ def get_user_collaborative_scores(user_id: int):
 
 async def get_user_interaction_history(user_id: int):
     """Get offers user has interacted with"""
-    if interactions_df.empty:
-        return set()
+    return set(user_interactions.get(user_id, ()))
+
+def apply_interaction_events(events: List[InteractionEvent]):
+    """Apply interaction events to the in-memory recommendation structures"""
+    global user_offer_matrix, popularity_scores
+    
+    if popularity_scores is None:
+        popularity_scores = {}
+    if user_offer_matrix is None:
+        user_offer_matrix = pd.DataFrame()
+    
+    # Strongest signal per user/offer pair in this batch
+    strongest = {}
+    for event in events:
+        interaction = EVENT_INTERACTION_WEIGHTS[event.type]
+        enrolled = event.type == "enroll"
+        
+        # Popularity uses the same formula as initialization
+        score = interaction + (ENROLLMENT_BONUS if enrolled else 0)
+        popularity_scores[event.offer_id] = popularity_scores.get(event.offer_id, 0) + score
+        
+        user_interactions.setdefault(event.user_id, set()).add(event.offer_id)
+        
+        pair = (event.user_id, event.offer_id)
+        strongest[pair] = max(strongest.get(pair, 0), interaction)
+    
+    if not strongest:
+        return
+    
+    # Grow the matrix once per batch: each enlargement copies the whole dense frame
+    new_users = list(dict.fromkeys(u for u, _ in strongest if u not in user_offer_matrix.index))
+    new_offers = list(dict.fromkeys(o for _, o in strongest if o not in user_offer_matrix.columns))
+    if new_users or new_offers:
+        user_offer_matrix = user_offer_matrix.reindex(
+            index=user_offer_matrix.index.append(pd.Index(new_users)),
+            columns=user_offer_matrix.columns.append(pd.Index(new_offers)),
+            fill_value=0
+        )
+    
+    # Keep the strongest signal seen for each pair (scalar writes are in place)
+    for (user_id, offer_id), interaction in strongest.items():
+        current = user_offer_matrix.at[user_id, offer_id]
+        if interaction > current:
+            user_offer_matrix.at[user_id, offer_id] = interaction
+
+def event_to_history_data(event: InteractionEvent) -> dict:
+    """Convert an interaction event to History create data"""
+    event_time = event.timestamp or datetime.now()
+    enrolled = event.type == "enroll"
+    return {
+        'userId': event.user_id,
+        'tourId': event.offer_id,
+        'viewedAt': event_time,
+        'interaction': EVENT_INTERACTION_WEIGHTS[event.type],
+        'enrolled': enrolled,
+        'enrolledAt': event_time if enrolled else None
+    }
+
+def buffered_event_rows() -> int:
+    """Rows waiting to be written: queued, awaiting user confirmation or awaiting a retry"""
+    queued = event_queue.qsize() if event_queue is not None else 0
+    return queued + len(event_unconfirmed) + sum(len(chunk) for chunk in event_retry_chunks)
+
+async def confirm_users(user_ids: set) -> set:
+    """Subset of user_ids that exist in the database, remembered in known_users"""
+    if not prisma.is_connected():
+        await prisma.connect()
+    users = await prisma.user.find_many(where={"id": {"in": list(user_ids)}})
+    confirmed = {user.id for user in users}
+    known_users.add(confirmed)
+    return confirmed
+
+async def confirm_event_users(items: list) -> list:
+    """Drop queued events of users that do not exist and apply the newly confirmed ones.
+    
+    items are (event, applied) pairs; applied tells whether the event already reached
+    the in-memory model at ingest time. Users not confirmed yet are looked up with one
+    query per flush; if that fails their events wait for the next flush.
+    """
+    global event_rows_unknown_user
+    unconfirmed = {event.user_id for event, applied in items if not applied and event.user_id not in known_users}
+    if unconfirmed:
+        try:
+            confirmed = await confirm_users(unconfirmed)
+        except Exception as e:
+            logger.error(f"Could not confirm {len(unconfirmed)} users, will retry: {e}")
+            event_unconfirmed.extend(item for item in items if item[0].user_id in unconfirmed)
+            items = [item for item in items if item[0].user_id not in unconfirmed]
+        else:
+            missing = unconfirmed - confirmed
+            if missing:
+                kept = [item for item in items if item[0].user_id not in missing]
+                event_rows_unknown_user += len(items) - len(kept)
+                logger.warning(f"Dropping {len(items) - len(kept)} events of unknown users")
+                items = kept
+    
+    # Events of users confirmed after ingest reach the model only now
+    apply_interaction_events([event for event, applied in items if not applied])
+    return items
+
+async def flush_event_queue(max_items: Optional[int] = None) -> int:
+    """Write buffered events to History in chunks, returns rows written.
+    
+    Failed chunks are kept for the next flush. When another write in the same
+    flush succeeded the database is up, so the failure comes from the rows:
+    the chunk is split in halves to isolate them, and single rows that still
+    fail are dropped.
+    """
+    global event_rows_dropped
+    retry = list(event_retry_chunks)
+    event_retry_chunks.clear()
+    
+    items = list(event_unconfirmed)
+    event_unconfirmed.clear()
+    while event_queue is not None and not event_queue.empty() and (max_items is None or len(items) < max_items):
+        items.append(event_queue.get_nowait())
+    
+    pending = [event_to_history_data(event) for event, _ in await confirm_event_users(items)] if items else []
+    chunks = retry + [pending[start:start + EVENT_FLUSH_BATCH_SIZE] for start in range(0, len(pending), EVENT_FLUSH_BATCH_SIZE)]
+    if not chunks:
+        return 0
+    
+    written = 0
+    failed = []
+    for chunk in chunks:
+        try:
+            if not prisma.is_connected():
+                await prisma.connect()
+            written += await prisma.history.create_many(data=chunk)
+        except Exception as e:
+            logger.error(f"Error writing {len(chunk)} history events, will retry: {e}")
+            failed.append(chunk)
     
-    user_interactions = interactions_df[interactions_df['user_id'] == user_id]
-    return set(user_interactions['offer_id'].tolist())
+    for chunk in failed:
+        if written == 0:
+            event_retry_chunks.append(chunk)
+        elif len(chunk) > 1:
+            middle = len(chunk) // 2
+            event_retry_chunks.extend([chunk[:middle], chunk[middle:]])
+        else:
+            event_rows_dropped += 1
+            logger.error(f"Dropping history event that cannot be written: {chunk[0]}")
+    
+    logger.info(f"Flushed {written} history events to database")
+    return written
+
+async def _event_flusher_loop():
+    """Periodically flush buffered events"""
+    while True:
+        await asyncio.sleep(EVENT_FLUSH_INTERVAL_SECONDS)
+        try:
+            await flush_event_queue()
+        except Exception as e:
+            logger.error(f"Event flusher error: {e}")
+
+def start_event_flusher():
+    """Create the event queue and start the background flusher"""
+    global event_queue, event_flusher_task
+    if event_queue is None:
+        event_queue = asyncio.Queue(maxsize=EVENT_QUEUE_MAX_SIZE)
+    if event_flusher_task is None or event_flusher_task.done():
+        event_flusher_task = asyncio.create_task(_event_flusher_loop())
+
+async def stop_event_flusher():
+    """Stop the background flusher and write any remaining events"""
+    global event_flusher_task
+    if event_flusher_task is not None:
+        event_flusher_task.cancel()
+        try:
+            await event_flusher_task
+        except asyncio.CancelledError:
+            pass
+        event_flusher_task = None
+    await flush_event_queue()
 
 def calculate_hybrid_scores(user_id: int, offer_id: Optional[int] = None, exclude_offers: set = None):
     """Calculate hybrid scores for recommendations"""
@@ -238,6 +563,40 @@ def calculate_hybrid_scores(user_id: int, offer_id: Optional[int] = None, exclud
         logger.error(f"Error calculating hybrid scores: {e}")
         return []
 
+def _structure_nbytes(value) -> int:
+    """Approximate in-memory size of a model structure in bytes"""
+    if value is None:
+        return 0
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if hasattr(value, 'data') and hasattr(value, 'indices') and hasattr(value, 'indptr'):
+        # scipy sparse CSR/CSC matrix
+        return int(value.data.nbytes + value.indices.nbytes + value.indptr.nbytes)
+    if isinstance(value, dict):
+        size = sys.getsizeof(value)
+        for key, item in value.items():
+            size += sys.getsizeof(key)
+            size += sys.getsizeof(item) + (sum(sys.getsizeof(v) for v in item) if isinstance(item, set) else 0)
+        return size
+    return sys.getsizeof(value)
+
+def get_memory_report() -> dict:
+    """Byte size of each in-memory recommendation structure"""
+    structures = {
+        "offers_df": offers_df,
+        "interactions_df": interactions_df,
+        "content_matrix": content_matrix,
+        "content_similarity": content_similarity,
+        "user_offer_matrix": user_offer_matrix,
+        "popularity_scores": popularity_scores,
+        "user_interactions": user_interactions,
+    }
+    report = {name: _structure_nbytes(value) for name, value in structures.items()}
+    report["total"] = sum(report.values())
+    return report
+
 @router.get("/initialize")
 async def manual_initialize():
     """Manually initialize the recommendation system"""
@@ -254,7 +613,102 @@ async def manual_initialize():
         "total_interactions": total_interactions
     }
 
+@router.post("/events")
+@timed_route("events")
+async def ingest_events(batch: InteractionEventBatch):
+    """Ingest view/click/enroll events and buffer them for bulk writes"""
+    try:
+        if not batch.events:
+            raise HTTPException(status_code=400, detail="No events provided")
+        if len(batch.events) > MAX_EVENTS_PER_REQUEST:
+            raise HTTPException(status_code=413, detail=f"Too many events. Maximum per request: {MAX_EVENTS_PER_REQUEST}")
+        
+        if not is_initialized:
+            await initialize_recommendation_system()
+        start_event_flusher()
+        
+        # Only accept events for tours known to the recommender; users are confirmed by the flusher
+        known_offers = set(offers_df['offer_id']) if offers_df is not None and not offers_df.empty else set()
+        accepted = [event for event in batch.events if event.offer_id in known_offers]
+        rejected = len(batch.events) - len(accepted)
+        
+        # Rows awaiting a retry count against the buffer too
+        if EVENT_QUEUE_MAX_SIZE - buffered_event_rows() < len(accepted):
+            raise HTTPException(status_code=503, detail="Event buffer is full, please retry later")
+        
+        # Events of users not confirmed yet reach the model once the flusher confirms them
+        applied = [event.user_id in known_users for event in accepted]
+        apply_interaction_events([event for event, known in zip(accepted, applied) if known])
+        for item in zip(accepted, applied):
+            event_queue.put_nowait(item)
+        
+        # Flush early once a full chunk is waiting
+        if event_queue.qsize() >= EVENT_FLUSH_BATCH_SIZE:
+            asyncio.create_task(flush_event_queue(EVENT_FLUSH_BATCH_SIZE))
+        
+        return {
+            "accepted": len(accepted),
+            "rejected": rejected,
+            "buffered": buffered_event_rows()
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error ingesting events: {e}")
+        raise HTTPException(status_code=500, detail=f"Error ingesting events: {str(e)}")
+
+@router.get("/health")
+async def health_check():
+    """Health check endpoint"""
+    try:
+        if not is_initialized:
+            await initialize_recommendation_system()
+        
+        total_offers = len(offers_df) if offers_df is not None else 0
+        total_interactions = len(interactions_df) if interactions_df is not None else 0
+        
+        return {
+            "status": "healthy" if is_initialized else "unhealthy", 
+            "total_offers": total_offers, 
+            "total_interactions": total_interactions,
+            "system_initialized": is_initialized,
+            "database_connected": prisma.is_connected()
+        }
+    except Exception as e:
+        logger.error(f"Health check failed: {e}")
+        return {
+            "status": "unhealthy",
+            "error": str(e),
+            "system_initialized": False,
+            "database_connected": False
+        }
+
+@router.get("/introspection")
+async def introspection():
+    """Model generation, build timings, memory usage and route latencies"""
+    return {
+        "model": {
+            "generation": model_generation,
+            "built_at": model_built_at.isoformat() if model_built_at else None,
+            "stage_seconds": {stage: round(seconds, 4) for stage, seconds in model_stage_seconds.items()},
+            "system_initialized": is_initialized
+        },
+        "memory_bytes": get_memory_report(),
+        "event_buffer": {
+            "buffered": buffered_event_rows(),
+            "awaiting_user_confirmation": len(event_unconfirmed),
+            "awaiting_retry": sum(len(chunk) for chunk in event_retry_chunks),
+            "dropped": event_rows_dropped,
+            "dropped_unknown_user": event_rows_unknown_user,
+            "known_users": len(known_users),
+            "capacity": EVENT_QUEUE_MAX_SIZE
+        },
+        "route_latency_ms": {name: histogram.snapshot() for name, histogram in route_latencies.items()}
+    }
+
 @router.get("/{user_id}")
+@timed_route("main_page")
 async def recommend_main_page(user_id: int, top_n: int = Query(5, ge=1, le=20)):
     """Get recommendations for main page"""
     try:
@@ -298,6 +752,7 @@ async def recommend_main_page(user_id: int, top_n: int = Query(5, ge=1, le=20)):
         raise HTTPException(status_code=500, detail=f"Error generating recommendations: {str(e)}")
 
 @router.get("/{user_id}/{offer_id}")
+@timed_route("offer_page")
 async def recommend_page_specific(user_id: int, offer_id: int, top_n: int = Query(5, ge=1, le=20)):
     """Get recommendations for specific offer page"""
     try:
@@ -330,29 +785,3 @@ async def recommend_page_specific(user_id: int, offer_id: int, top_n: int = Quer
     except Exception as e:
         logger.error(f"Error generating specific recommendations for user {user_id}, offer {offer_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Error generating recommendations: {str(e)}")
-
-@router.get("/health")
-async def health_check():
-    """Health check endpoint"""
-    try:
-        if not is_initialized:
-            await initialize_recommendation_system()
-        
-        total_offers = len(offers_df) if offers_df is not None else 0
-        total_interactions = len(interactions_df) if interactions_df is not None else 0
-        
-        return {
-            "status": "healthy" if is_initialized else "unhealthy", 
-            "total_offers": total_offers, 
-            "total_interactions": total_interactions,
-            "system_initialized": is_initialized,
-            "database_connected": prisma.is_connected()
-        }
-    except Exception as e:
-        logger.error(f"Health check failed: {e}")
-        return {
-            "status": "unhealthy",
-            "error": str(e),
-            "system_initialized": False,
-            "database_connected": False
-        }
\ No newline at end of file
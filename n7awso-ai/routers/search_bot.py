@@ -1,10 +1,13 @@
 import json
-from fastapi import APIRouter, Request
+import math
+from fastapi import APIRouter, Request, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional
 
 import google.generativeai as genai
 
+from services.llm_scheduler import LLMCapacityExceeded, estimate_prompt_tokens, llm_scheduler, response_tokens
+
 # Load trip plans from JSON file
 with open("trip_plans.json", "r", encoding="utf-8") as f:
     TRIP_PLANS = json.load(f)
@@ -12,6 +15,7 @@ with open("trip_plans.json", "r", encoding="utf-8") as f:
 # Gemini API setup (replace with your API key)
 genai.configure(api_key="YOUR_GEMINI_API_KEY")
 MODEL = "models/gemini-1.5-flash-latest"
+model = genai.GenerativeModel(MODEL)
 
 router = APIRouter()
 
@@ -50,7 +54,16 @@ async def chat_with_bot(request: Request):
         f"Message: {user_message}\n"
         "Respond in JSON format with keys: destination, date, budget, agency, activities."
     )
-    response = genai.generate_content(MODEL, prompt)
+    try:
+        async with llm_scheduler.slot("gemini", estimate_prompt_tokens(prompt, 200)) as reservation:
+            response = await model.generate_content_async(prompt)
+            reservation.record(response_tokens(response))
+    except LLMCapacityExceeded as e:
+        raise HTTPException(
+            status_code=503,
+            detail="The search assistant is busy, please retry shortly",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
     try:
         preferences_json = json.loads(response.text)
         preferences = UserPreferences(**preferences_json)
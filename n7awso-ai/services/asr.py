@@ -0,0 +1,249 @@
+"""
+Speech recognition backends for SpeechToTextProcessor.
+
+A backend turns 16 kHz mono PCM WAV into text. Two are provided:
+
+- ``google``: Google Speech Recognition through ``speech_recognition``, run on
+  a bounded thread pool because every call is a blocking network request.
+- ``whisper``: local, offline Whisper inference in worker processes. Requests
+  arriving within a short window are micro-batched into one inference call.
+
+Select one with ASR_BACKEND; see build_asr_backend for the other settings.
+"""
+
+import asyncio
+import io
+import logging
+import os
+import threading
+from collections import defaultdict
+
+import speech_recognition as sr
+
+from services.worker_pool import BoundedWorkerPool
+from services.whisper_worker import transcribe_batch, warm_up
+
+logger = logging.getLogger(__name__)
+
+PCM_BYTES_PER_SECOND = 16000 * 2
+WHISPER_MODEL_SIZES = ["tiny", "base", "small", "medium", "large"]
+
+
+class UnreadableAudio(Exception):
+    """The audio could not be read"""
+
+
+class UnrecognizedSpeech(Exception):
+    """The audio was read but no speech could be recognized"""
+
+
+class ASRServiceError(Exception):
+    """The recognition service failed"""
+
+
+def whisper_language(language: str):
+    """Whisper language code for a locale such as en-US or ar-DZ (None lets Whisper detect it)"""
+    return language.split("-")[0].lower() if language else None
+
+
+class ASRBackend:
+    """Interface of a speech recognition backend"""
+
+    name = "base"
+    # Local backends cost no network round trip per call (e.g. for partial transcripts)
+    local = False
+
+    async def transcribe(self, pcm_wav: bytes, language: str) -> str:
+        raise NotImplementedError
+
+    def start(self):
+        """Start workers ahead of the first request (optional)"""
+
+    def shutdown(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+
+class GoogleSpeechBackend(ASRBackend):
+    """Google Speech Recognition on a bounded thread pool"""
+
+    name = "google"
+
+    def __init__(self, api_key: str = None, max_workers: int = 4, max_queue: int = 16):
+        self.api_key = api_key
+        # Recognition blocks on decoding and network calls, so it runs on its own bounded pool
+        self.pool = BoundedWorkerPool("speech", max_workers=max_workers, max_queue=max_queue)
+
+    async def transcribe(self, pcm_wav: bytes, language: str) -> str:
+        cancel_event = threading.Event()
+        try:
+            return await self.pool.run(self._recognize, pcm_wav, language, cancel_event)
+        except asyncio.CancelledError:
+            # A job already running in a thread cannot be interrupted; it stops before its next network call
+            cancel_event.set()
+            raise
+
+    def _recognize(self, audio_bytes: bytes, language: str, cancel_event: threading.Event) -> str:
+        """Blocking speech recognition (runs on a worker thread)"""
+        recognizer = sr.Recognizer()
+        try:
+            # Silence is already trimmed by the VAD stage, so the whole clip is recorded
+            with sr.AudioFile(io.BytesIO(audio_bytes)) as source:
+                audio_data = recognizer.record(source)
+                logger.info("Audio data successfully loaded for recognition")
+        except Exception as file_error:
+            logger.warning(f"AudioFile method failed: {file_error}")
+            raise UnreadableAudio(str(file_error))
+
+        if cancel_event.is_set():
+            logger.info("Speech recognition cancelled before the recognition request")
+            return ""
+
+        # Use Google Speech Recognition API
+        if self.api_key:
+            try:
+                text = recognizer.recognize_google(audio_data, key=self.api_key, language=language)
+                logger.info(f"Speech recognition successful (API): {len(text)} characters")
+                return text
+            except sr.RequestError as e:
+                logger.warning(f"Google Speech API error: {e}, falling back to free service")
+            except sr.UnknownValueError:
+                raise UnrecognizedSpeech()
+
+            if cancel_event.is_set():
+                return ""
+
+        # Fallback to free Google Speech Recognition
+        try:
+            text = recognizer.recognize_google(audio_data, language=language)
+            logger.info(f"Speech recognition successful (free): {len(text)} characters")
+            return text
+        except sr.UnknownValueError:
+            raise UnrecognizedSpeech()
+        except sr.RequestError as e:
+            logger.error(f"Speech recognition service error: {e}")
+            raise ASRServiceError(str(e))
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "pool": self.pool.stats()}
+
+
+class WhisperBackend(ASRBackend):
+    """Local Whisper inference in worker processes with micro-batching"""
+
+    name = "whisper"
+    local = True
+
+    def __init__(self, model_size: str = "base", max_workers: int = 1, max_queue: int = 16,
+                 batch_window_ms: float = 50, max_batch: int = 8):
+        if model_size not in WHISPER_MODEL_SIZES:
+            raise ValueError(f"Unknown Whisper model size '{model_size}', expected one of {WHISPER_MODEL_SIZES}")
+        self.model_size = model_size
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch = max_batch
+        # Each worker process holds its own copy of the model
+        self.pool = BoundedWorkerPool("whisper", max_workers=max_workers, max_queue=max_queue, kind="process")
+        self._pending = []  # (pcm_wav, language, future)
+        self._flush_handle = None
+        self._batch_tasks = set()
+        self.batches = 0
+        self.batched_clips = 0
+        self.audio_seconds = 0.0
+        self.inference_seconds = 0.0
+
+    async def transcribe(self, pcm_wav: bytes, language: str) -> str:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((pcm_wav, whisper_language(language), future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+
+        text = await future
+        if not text:
+            raise UnrecognizedSpeech()
+        return text
+
+    def _flush(self):
+        """Send everything collected in the current window, one batch per language"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+
+        by_language = defaultdict(list)
+        for item in pending:
+            # Requests cancelled while waiting for the window are dropped
+            if not item[2].done():
+                by_language[item[1]].append(item)
+        for language, items in by_language.items():
+            task = asyncio.ensure_future(self._run_batch(language, items))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run_batch(self, language, items):
+        clips = [clip for clip, _, _ in items]
+        try:
+            texts, inference_seconds = await self.pool.run(transcribe_batch, self.model_size, clips, language)
+        except Exception as e:
+            logger.error(f"Whisper batch of {len(items)} failed: {e}")
+            for _, _, future in items:
+                if not future.done():
+                    future.set_exception(e if isinstance(e, Exception) else ASRServiceError(str(e)))
+            return
+
+        self.batches += 1
+        self.batched_clips += len(items)
+        self.audio_seconds += sum(len(clip) for clip in clips) / PCM_BYTES_PER_SECOND
+        self.inference_seconds += inference_seconds
+        for (_, _, future), text in zip(items, texts):
+            if not future.done():
+                future.set_result(text)
+
+    def start(self):
+        # Load the model in the worker processes before the first request
+        for _ in range(self.pool.max_workers):
+            self.pool.executor.submit(warm_up, self.model_size)
+
+    def shutdown(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        self.pool.shutdown()
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "model_size": self.model_size,
+            "batches": self.batches,
+            "mean_batch_size": round(self.batched_clips / self.batches, 2) if self.batches else None,
+            "audio_seconds": round(self.audio_seconds, 2),
+            "inference_seconds": round(self.inference_seconds, 2),
+            "real_time_factor": round(self.inference_seconds / self.audio_seconds, 3) if self.audio_seconds else None,
+            "pool": self.pool.stats(),
+        }
+
+
+def build_asr_backend(name: str = None) -> ASRBackend:
+    """Backend selected by ASR_BACKEND (google or whisper) and its environment settings"""
+    name = (name or os.getenv("ASR_BACKEND", "google")).lower()
+    if name == "whisper":
+        return WhisperBackend(
+            model_size=os.getenv("WHISPER_MODEL_SIZE", "base"),
+            max_workers=int(os.getenv("WHISPER_WORKERS", "1")),
+            max_queue=int(os.getenv("WHISPER_MAX_QUEUE", "16")),
+            batch_window_ms=float(os.getenv("WHISPER_BATCH_WINDOW_MS", "50")),
+            max_batch=int(os.getenv("WHISPER_MAX_BATCH", "8")),
+        )
+    if name != "google":
+        logger.warning(f"Unknown ASR backend '{name}', using google")
+    return GoogleSpeechBackend(
+        api_key=os.getenv("GOOGLE_API_KEY"),
+        max_workers=int(os.getenv("SPEECH_WORKERS", "4")),
+        max_queue=int(os.getenv("SPEECH_MAX_QUEUE", "16")),
+    )
@@ -0,0 +1,62 @@
+"""
+Audio transcoding for the voice endpoints.
+
+Uploads (wav, webm/opus, ogg, mp3, mp4) are normalized to 16 kHz mono 16-bit
+PCM WAV, the format speech recognition works with. Decoding is CPU heavy, so
+these functions are meant to run in a worker process; the module only imports
+what decoding needs so worker processes start quickly.
+"""
+
+import io
+import time
+import wave
+
+from pydub import AudioSegment
+
+TARGET_SAMPLE_RATE = 16000
+TARGET_CHANNELS = 1
+TARGET_SAMPLE_WIDTH = 2
+
+# Upload content type -> pydub/ffmpeg input format
+CONTENT_TYPE_FORMATS = {
+    "audio/wav": "wav",
+    "audio/x-wav": "wav",
+    "audio/wave": "wav",
+    "audio/webm": "webm",
+    "audio/ogg": "ogg",
+    "audio/mpeg": "mp3",
+    "audio/mp4": "mp4",
+}
+
+
+def audio_format(content_type: str) -> str:
+    """pydub format name for an upload content type (parameters such as codecs=opus are ignored)"""
+    base = (content_type or "audio/wav").split(";")[0].strip().lower()
+    return CONTENT_TYPE_FORMATS.get(base, "wav")
+
+
+def is_target_wav(data: bytes) -> bool:
+    """True if data is already 16 kHz mono 16-bit PCM WAV"""
+    try:
+        with wave.open(io.BytesIO(data)) as wav:
+            return (
+                wav.getframerate() == TARGET_SAMPLE_RATE
+                and wav.getnchannels() == TARGET_CHANNELS
+                and wav.getsampwidth() == TARGET_SAMPLE_WIDTH
+            )
+    except (wave.Error, EOFError):
+        return False
+
+
+def transcode_to_pcm_wav(data: bytes, fmt: str):
+    """Decode audio, downmix and resample it; returns (wav bytes, decode seconds)"""
+    start = time.perf_counter()
+    segment = AudioSegment.from_file(io.BytesIO(data), format=fmt)
+    segment = (
+        segment.set_channels(TARGET_CHANNELS)
+        .set_frame_rate(TARGET_SAMPLE_RATE)
+        .set_sample_width(TARGET_SAMPLE_WIDTH)
+    )
+    output = io.BytesIO()
+    segment.export(output, format="wav")
+    return output.getvalue(), time.perf_counter() - start
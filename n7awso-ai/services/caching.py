@@ -0,0 +1,295 @@
+"""
+In-process caches of the chat assistant.
+
+ResponseCache keeps answers to context-free questions, SessionHistoryCache
+bounds the chat histories held in memory and TranscriptionCache keeps voice
+transcripts keyed by a hash of the audio.
+"""
+
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from services.retrieval import TOKEN_PATTERN, fold_text
+
+logger = logging.getLogger(__name__)
+
+
+NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)?", re.UNICODE)
+
+WORD_PATTERN = re.compile(r"[^\W\d_]+", re.UNICODE)
+
+
+class ResponseCache:
+    """Cache of assistant answers to context-free questions.
+
+    Entries are keyed on the normalized message plus the ids of the retrieved
+    knowledge passages. When a similarity threshold is configured (off by
+    default), a miss falls back to the most similar cached question from the
+    same user with the same passages and exactly the same numbers and names.
+    """
+
+    def __init__(self, embedder, max_entries: int, ttl_seconds: float, similarity_threshold: Optional[float]):
+        self.embedder = embedder
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()  # key -> (response, vector, created, details, user_id)
+        self._by_snippets = {}  # snippet ids -> set of keys
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(message: str) -> str:
+        return " ".join(TOKEN_PATTERN.findall(fold_text(message)))
+
+    @staticmethod
+    def details(message: str) -> frozenset:
+        """Numbers and capitalized names in the message; a similar question must repeat them exactly"""
+        numbers = {str(float(n.replace(",", "."))) for n in NUMBER_PATTERN.findall(message)}
+        names = set()
+        for sentence in re.split(r"[.!?؟\n]+", message):
+            # The first word of a sentence is capitalized anyway
+            for word in WORD_PATTERN.findall(sentence)[1:]:
+                if word[0].isupper():
+                    names.add(fold_text(word))
+        return frozenset(numbers | names)
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        keys = self._by_snippets.get(key[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_snippets[key[1]]
+
+    def _is_fresh(self, created: float) -> bool:
+        return time.monotonic() - created <= self.ttl_seconds
+
+    def get(self, message: str, snippet_ids: tuple, user_id: Optional[str] = None) -> Optional[str]:
+        """Cached answer for the message, or None"""
+        key = (self.normalize(message), snippet_ids)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if self._is_fresh(entry[2]):
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry[0]
+            self._remove(key)
+
+        # Near-duplicates are only reused within one user's questions
+        if self.similarity_threshold is not None and user_id and self._by_snippets.get(snippet_ids):
+            query_vector = self.embedder.embed([key[0]])[0]
+            query_details = self.details(message)
+            best_key, best_score = None, self.similarity_threshold
+            for candidate in list(self._by_snippets[snippet_ids]):
+                response, vector, created, details, owner = self._entries[candidate]
+                if not self._is_fresh(created):
+                    self._remove(candidate)
+                    continue
+                if owner != user_id or details != query_details:
+                    continue
+                score = float(vector @ query_vector)
+                if score >= best_score:
+                    best_key, best_score = candidate, score
+            if best_key is not None:
+                self._entries.move_to_end(best_key)
+                self.similar_hits += 1
+                return self._entries[best_key][0]
+
+        self.misses += 1
+        return None
+
+    def put(self, message: str, snippet_ids: tuple, response: str, user_id: Optional[str] = None):
+        key = (self.normalize(message), snippet_ids)
+        vector = self.embedder.embed([key[0]])[0] if self.similarity_threshold is not None else None
+        self._remove(key)
+        self._entries[key] = (response, vector, time.monotonic(), self.details(message), user_id)
+        self._by_snippets.setdefault(snippet_ids, set()).add(key)
+        self.stores += 1
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.exact_hits + self.similar_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "similarity_threshold": self.similarity_threshold,
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else None,
+            "stores": self.stores,
+            "evictions": self.evictions
+        }
+
+
+class SessionHistoryCache:
+    """LRU cache of session histories bounded by session count, message bytes and idle TTL.
+
+    Evicted sessions are reloaded lazily from the database on their next turn.
+    """
+
+    def __init__(self, max_sessions: int, max_bytes: int, idle_ttl_seconds: float):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self._entries = OrderedDict()  # session_id -> (history, last_access)
+        self._evicted_ids = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.reloads = 0
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    def get(self, session_id: str):
+        """Return the cached history and mark it as recently used"""
+        entry = self._entries.get(session_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        history, last_access = entry
+        now = time.monotonic()
+        if now - last_access > self.idle_ttl_seconds:
+            self._remove(session_id)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries[session_id] = (history, now)
+        self._entries.move_to_end(session_id)
+        self.hits += 1
+        return history
+
+    def put(self, session_id: str, history):
+        """Insert a history and evict least recently used sessions over the limits"""
+        if self._evicted_ids.pop(session_id, None) is not None:
+            self.reloads += 1
+        self._entries[session_id] = (history, time.monotonic())
+        self._entries.move_to_end(session_id)
+        self._enforce_limits()
+
+    def peek(self, session_id: str):
+        """Return the cached history without touching LRU order or stats"""
+        entry = self._entries.get(session_id)
+        return entry[0] if entry else None
+
+    def pop(self, session_id: str):
+        """Remove a session without counting it as an eviction"""
+        entry = self._entries.pop(session_id, None)
+        return entry[0] if entry else None
+
+    def total_bytes(self) -> int:
+        return sum(history.size_bytes for history, _ in self._entries.values())
+
+    def _remove(self, session_id: str):
+        self._entries.pop(session_id, None)
+        self._evicted_ids[session_id] = True
+        # Only remember as many evicted ids as we can hold sessions
+        while len(self._evicted_ids) > self.max_sessions:
+            self._evicted_ids.popitem(last=False)
+
+    def _enforce_limits(self):
+        now = time.monotonic()
+        for session_id, (_, last_access) in list(self._entries.items()):
+            if now - last_access <= self.idle_ttl_seconds:
+                break
+            self._remove(session_id)
+            self.expirations += 1
+
+        total = self.total_bytes()
+        # Never evict the most recently used session
+        while len(self._entries) > 1 and (len(self._entries) > self.max_sessions or total > self.max_bytes):
+            session_id, (history, _) = next(iter(self._entries.items()))
+            total -= history.size_bytes
+            self._remove(session_id)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "sessions": len(self._entries),
+            "max_sessions": self.max_sessions,
+            "total_bytes": self.total_bytes(),
+            "max_bytes": self.max_bytes,
+            "idle_ttl_seconds": self.idle_ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "reloads": self.reloads
+        }
+
+
+class TranscriptionCache:
+    """Transcripts keyed by a content hash of the audio plus the language.
+
+    Both the raw upload and its normalized PCM are hashed: the first is known
+    before any decoding, the second also matches the same recording re-sent in
+    another container. Only successful transcriptions are stored.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (text, seconds to produce, created)
+        self.raw_hits = 0
+        self.pcm_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def key(audio: bytes, language: str) -> str:
+        return f"{language}:{hashlib.blake2b(audio, digest_size=16).hexdigest()}"
+
+    def get(self, key: str, normalized: bool = False) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        text, seconds, created = entry
+        if time.monotonic() - created > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        if normalized:
+            self.pcm_hits += 1
+        else:
+            self.raw_hits += 1
+        self.saved_seconds += seconds
+        return text
+
+    def put(self, keys, text: str, seconds: float):
+        for key in set(keys):
+            self._entries[key] = (text, seconds, time.monotonic())
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.raw_hits + self.pcm_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "raw_hits": self.raw_hits,
+            "pcm_hits": self.pcm_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else None,
+            "saved_seconds": round(self.saved_seconds, 2)
+        }
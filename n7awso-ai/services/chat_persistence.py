@@ -0,0 +1,311 @@
+"""
+Write-behind persistence of chat messages and session activity.
+
+Both classes take the router's database manager (``prisma`` client plus
+``ensure_connection()``) and batch their writes in a background task.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class ChatMessageWriter:
+    """Write-behind queue that persists chat messages in bulk.
+
+    Messages get their id and timestamp when queued, so callers can respond
+    immediately; a single background task groups everything queued within
+    WRITE_BEHIND_INTERVAL_SECONDS (across sessions) into one create_many.
+    Timestamps are strictly increasing, which keeps per-session ordering.
+
+    The queue holds at most MAX_PENDING messages; once it is full, enqueue()
+    waits for room, so a stalled database slows chat turns down instead of
+    growing memory. A failing batch is retried with exponential backoff for
+    RETRY_WINDOW_SECONDS, then set aside and retried after the next
+    successful write rather than dropped.
+    """
+
+    WRITE_BEHIND_INTERVAL_SECONDS = float(os.getenv("CHAT_WRITE_BEHIND_INTERVAL_MS", "5")) / 1000
+    MAX_BATCH_SIZE = 500
+    MAX_PENDING = int(os.getenv("CHAT_WRITE_BEHIND_MAX_PENDING", "10000"))
+    RETRY_WINDOW_SECONDS = float(os.getenv("CHAT_WRITE_BEHIND_RETRY_SECONDS", "120"))
+    MAX_BACKOFF_SECONDS = 5.0
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self._queue = None
+        self._task = None
+        self._last_timestamp = None
+        self._parked = deque()  # batches that outlived their retry window
+        self.queued = 0
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.failed = 0
+
+    def start(self):
+        """Start the background writer on the running event loop"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.MAX_PENDING)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def enqueue(self, session_id: str, role: str, content: str) -> str:
+        """Queue a message for persistence and return its message id (waits while the queue is full)"""
+        self.start()
+        message_id = str(uuid.uuid4())
+        timestamp = datetime.now()
+        if self._last_timestamp is not None and timestamp <= self._last_timestamp:
+            timestamp = self._last_timestamp + timedelta(microseconds=1)
+        self._last_timestamp = timestamp
+
+        await self._queue.put({
+            "sessionId": session_id,
+            "messageId": message_id,
+            "role": role,
+            "content": content,
+            "timestamp": timestamp
+        })
+        self.queued += 1
+        return message_id
+
+    async def _run(self):
+        while True:
+            first = await self._queue.get()
+            if first is None:
+                return
+            # Let concurrent turns add their messages to the same batch
+            await asyncio.sleep(self.WRITE_BEHIND_INTERVAL_SECONDS)
+            batch = [first]
+            stopping = False
+            while not self._queue.empty() and len(batch) < self.MAX_BATCH_SIZE:
+                item = self._queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            if await self._write(batch):
+                await self._retry_parked()
+            if stopping:
+                return
+
+    async def _write_once(self, batch: List[Dict[str, Any]]):
+        await self.db_manager.ensure_connection()
+        await self.db_manager.prisma.chatmessage.create_many(data=batch)
+        self.written += len(batch)
+        self.batches += 1
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> bool:
+        """Write a batch, retrying with backoff; park it if the database stays unavailable"""
+        deadline = time.monotonic() + self.RETRY_WINDOW_SECONDS
+        delay = 0.1
+        attempt = 1
+        while True:
+            try:
+                await self._write_once(batch)
+                return True
+            except Exception as e:
+                logger.warning(f"Error writing {len(batch)} chat messages (attempt {attempt}): {e}")
+            if time.monotonic() + delay > deadline:
+                break
+            self.retries += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.MAX_BACKOFF_SECONDS)
+            attempt += 1
+        self._parked.append(batch)
+        logger.error(f"Set aside {len(batch)} chat messages after {attempt} attempts; retrying after the next successful write")
+        return False
+
+    async def _retry_parked(self):
+        """One attempt per parked batch, oldest first, stopping at the first failure"""
+        while self._parked:
+            try:
+                await self._write_once(self._parked[0])
+            except Exception as e:
+                logger.warning(f"Parked chat messages still cannot be written: {e}")
+                return
+            self._parked.popleft()
+
+    async def flush(self):
+        """Write everything queued so far"""
+        while self._queue is not None and not self._queue.empty():
+            batch = []
+            while not self._queue.empty() and len(batch) < self.MAX_BATCH_SIZE:
+                item = self._queue.get_nowait()
+                if item is not None:
+                    batch.append(item)
+            if batch and await self._write(batch):
+                await self._retry_parked()
+        await self._retry_parked()
+
+    async def stop(self):
+        """Stop the background writer once everything queued before it is written"""
+        if self._task is not None and not self._task.done():
+            # The sentinel lets the writer finish its current batch in order
+            await self._queue.put(None)
+            await self._task
+        self._task = None
+        await self.flush()
+        if self._parked:
+            self.failed += sum(len(batch) for batch in self._parked)
+            logger.error(f"Lost {sum(len(batch) for batch in self._parked)} chat messages that could not be written before shutdown")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "max_pending": self.MAX_PENDING,
+            "parked": sum(len(batch) for batch in self._parked),
+            "queued": self.queued,
+            "written": self.written,
+            "batches": self.batches,
+            "retries": self.retries,
+            "failed": self.failed
+        }
+
+
+class ChatSessionRegistry:
+    """In-process registry of sessions known to exist in the database.
+
+    Unknown sessions are created (or touched) with a single upsert. For known
+    sessions, lastActivity updates are only recorded in memory and written
+    every ACTIVITY_FLUSH_SECONDS in one batch: activity times are truncated to
+    ACTIVITY_RESOLUTION_SECONDS and each distinct value gets one update_many.
+    """
+
+    ACTIVITY_FLUSH_SECONDS = float(os.getenv("CHAT_SESSION_ACTIVITY_FLUSH_SECONDS", "60"))
+    ACTIVITY_RESOLUTION_SECONDS = float(os.getenv("CHAT_SESSION_ACTIVITY_RESOLUTION_SECONDS", "1"))
+    MAX_KNOWN_SESSIONS = int(os.getenv("CHAT_SESSION_REGISTRY_SIZE", "10000"))
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self._known = OrderedDict()
+        self._dirty = {}
+        self._pending_upserts = {}
+        self._task = None
+        self.hits = 0
+        self.upserts = 0
+        self.flushes = 0
+        self.flushed_sessions = 0
+
+    def start(self):
+        """Start the periodic lastActivity flush on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def ensure_session(self, session_id: str, user_id: str = None):
+        """Make sure the session row exists and record activity on it"""
+        now = datetime.now()
+        if session_id in self._known:
+            self._known.move_to_end(session_id)
+            self._dirty[session_id] = now
+            self.hits += 1
+            return
+
+        # Concurrent first turns of the same session share one upsert
+        pending = self._pending_upserts.get(session_id)
+        if pending is None:
+            pending = asyncio.ensure_future(self._upsert(session_id, user_id, now))
+            self._pending_upserts[session_id] = pending
+            pending.add_done_callback(lambda _: self._pending_upserts.pop(session_id, None))
+        await asyncio.shield(pending)
+
+    async def _upsert(self, session_id: str, user_id: str, now: datetime):
+        await self.db_manager.ensure_connection()
+        await self.db_manager.prisma.chatsession.upsert(
+            where={"sessionId": session_id},
+            data={
+                "create": {
+                    "sessionId": session_id,
+                    "userId": user_id,
+                    "createdAt": now,
+                    "lastActivity": now,
+                    "isActive": True
+                },
+                "update": {"lastActivity": now}
+            }
+        )
+        self.upserts += 1
+        logger.info(f"Registered chat session: {session_id}")
+
+        self._known[session_id] = True
+        # Forgotten sessions keep any pending activity until the next flush
+        while len(self._known) > self.MAX_KNOWN_SESSIONS:
+            self._known.popitem(last=False)
+
+    def touch(self, session_id: str):
+        """Record activity on a session already known to exist (no database lookup)"""
+        self._dirty[session_id] = datetime.now()
+
+    def forget(self, session_id: str):
+        """Drop a session, e.g. after it was cleared"""
+        self._known.pop(session_id, None)
+        self._dirty.pop(session_id, None)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.ACTIVITY_FLUSH_SECONDS)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing session activity: {e}")
+
+    def _truncate(self, activity: datetime) -> datetime:
+        resolution = self.ACTIVITY_RESOLUTION_SECONDS
+        return datetime.fromtimestamp(activity.timestamp() // resolution * resolution)
+
+    async def flush(self):
+        """Write coalesced lastActivity updates, one update_many per truncated activity time"""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        by_activity = {}
+        for session_id, activity in dirty.items():
+            by_activity.setdefault(self._truncate(activity), []).append(session_id)
+
+        await self.db_manager.ensure_connection()
+        try:
+            # One round trip for all groups
+            async with self.db_manager.prisma.batch_() as batcher:
+                for activity, session_ids in by_activity.items():
+                    batcher.chatsession.update_many(
+                        where={"sessionId": {"in": session_ids}},
+                        data={"lastActivity": activity}
+                    )
+            self.flushes += 1
+            self.flushed_sessions += len(dirty)
+        except Exception:
+            # Keep newer activity recorded while the write was in flight
+            for session_id, activity in dirty.items():
+                self._dirty.setdefault(session_id, activity)
+            raise
+
+    async def stop(self):
+        """Stop the periodic flush and write pending activity"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Error flushing session activity on shutdown: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "known_sessions": len(self._known),
+            "pending_activity": len(self._dirty),
+            "hits": self.hits,
+            "upserts": self.upserts,
+            "flushes": self.flushes,
+            "flushed_sessions": self.flushed_sessions
+        }
@@ -0,0 +1,124 @@
+"""
+Idempotency-Key handling for chat turns.
+"""
+
+import asyncio
+import functools
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class IdempotencyConflict(Exception):
+    """An idempotency key was reused with a different request body"""
+
+
+class IdempotencyTable:
+    """Bounded TTL table of chat turns keyed by the client's Idempotency-Key.
+
+    A repeated key attaches to the in-flight turn or returns its stored result,
+    so client retries do not trigger another LLM call or duplicate messages.
+    Failed turns are dropped so the client can retry them. Turns still running
+    are never evicted or expired, since callers are waiting on them.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (fingerprint, future, created)
+        self.in_flight_joins = 0
+        self.completed_replays = 0
+        self.evictions = 0
+
+    @staticmethod
+    def fingerprint(*parts) -> str:
+        return hashlib.sha1("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+    def lookup(self, key: str, fingerprint: str) -> Optional[asyncio.Future]:
+        """Future of an earlier turn with this key, or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_fingerprint, future, created = entry
+        if future.done() and time.monotonic() - created > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        if stored_fingerprint != fingerprint:
+            raise IdempotencyConflict(f"Idempotency key {key} was used with a different request")
+        if future.done():
+            self.completed_replays += 1
+        else:
+            self.in_flight_joins += 1
+        return future
+
+    def reserve(self, key: str, fingerprint: str) -> asyncio.Future:
+        """Register a new turn under the key; resolve it with complete() or fail()"""
+        future = asyncio.get_running_loop().create_future()
+        self._entries[key] = (fingerprint, future, time.monotonic())
+        self._evict()
+        return future
+
+    def _evict(self):
+        """Drop the oldest finished turns beyond max_entries (running turns stay)"""
+        excess = len(self._entries) - self.max_entries
+        if excess <= 0:
+            return
+        for key in [key for key, (_, future, _) in self._entries.items() if future.done()][:excess]:
+            del self._entries[key]
+            self.evictions += 1
+
+    def complete(self, key: str, future: asyncio.Future, result: Dict[str, Any]):
+        if not future.done():
+            future.set_result(result)
+        # The result is kept from completion for ttl_seconds
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] is future:
+            self._entries[key] = (entry[0], future, time.monotonic())
+        self._evict()
+
+    def fail(self, key: str, future: asyncio.Future, error: BaseException):
+        if not future.done():
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is future:
+                del self._entries[key]
+            future.set_exception(error)
+            # Mark retrieved; waiters (if any) still receive it
+            future.exception()
+
+    async def run(self, key: Optional[str], fingerprint: str, turn_factory) -> Dict[str, Any]:
+        """Run turn_factory() once per key; retries await the same result"""
+        if not key:
+            return await turn_factory()
+
+        future = self.lookup(key, fingerprint)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = self.reserve(key, fingerprint)
+        # The turn runs as its own task so a disconnecting client does not cancel it
+        # for the retry that is about to attach to it
+        task = asyncio.ensure_future(turn_factory())
+        task.add_done_callback(functools.partial(self._settle, key, future))
+        return await asyncio.shield(future)
+
+    def _settle(self, key: str, future: asyncio.Future, task: asyncio.Task):
+        """Resolve the reserved future itself, even if its entry has since been replaced"""
+        if task.cancelled():
+            self.fail(key, future, asyncio.CancelledError())
+        elif task.exception() is not None:
+            self.fail(key, future, task.exception())
+        else:
+            self.complete(key, future, task.result())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "in_flight": sum(1 for _, future, _ in self._entries.values() if not future.done()),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "in_flight_joins": self.in_flight_joins,
+            "completed_replays": self.completed_replays,
+            "avoided_llm_calls": self.in_flight_joins + self.completed_replays,
+            "evictions": self.evictions
+        }
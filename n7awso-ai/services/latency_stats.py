@@ -0,0 +1,58 @@
+"""
+Latency summaries shared by the metrics of routers and services.
+
+Rolling latency windows are all summarized the same way: nearest-rank
+percentiles over the retained samples (in seconds), reported in milliseconds.
+"""
+
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+
+def percentile(samples: Iterable[float], q: float) -> Optional[float]:
+    """Nearest-rank q-quantile (0 <= q <= 1) of the samples, None when there are none"""
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize_ms(samples: Iterable[float], quantiles: Sequence[float] = (0.5, 0.95),
+                 digits: int = 2, mean: bool = False) -> dict:
+    """{"p50_ms": ..., "p95_ms": ...} for latency samples in seconds (values are None when empty)"""
+    ordered = sorted(samples)
+    summary = {}
+    if mean:
+        summary["mean_ms"] = round(sum(ordered) / len(ordered) * 1000, digits) if ordered else None
+    for q in quantiles:
+        value = percentile(ordered, q)
+        summary[f"p{q * 100:g}_ms"] = round(value * 1000, digits) if value is not None else None
+    return summary
+
+
+class StageTimings:
+    """Rolling per-stage latencies of chat turns, and the time saved by running stages concurrently"""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._samples = {}
+        self.overlapped_turns = 0
+        self.saved_seconds = 0.0
+
+    def observe(self, stage: str, seconds: float):
+        self._samples.setdefault(stage, deque(maxlen=self.window)).append(seconds)
+
+    def observe_overlap(self, stage_seconds: List[float], wall_seconds: float):
+        """Record stages that ran concurrently: saved time is their sum minus the wall time"""
+        self.overlapped_turns += 1
+        self.saved_seconds += max(0.0, sum(stage_seconds) - wall_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        stages = {}
+        for stage, samples in self._samples.items():
+            stages[stage] = {"count": len(samples), **summarize_ms(samples, mean=True)}
+        return {
+            "stages": stages,
+            "overlapped_turns": self.overlapped_turns,
+            "saved_ms_per_turn": round(self.saved_seconds / self.overlapped_turns * 1000, 2) if self.overlapped_turns else None
+        }
@@ -0,0 +1,376 @@
+"""
+LLM router with hedged requests and provider failover.
+
+Wraps several chat models (e.g. Groq and Gemini). A request goes to the first
+healthy provider; if it has not answered within an adaptive deadline (its
+recent p95 latency, or p95 time-to-first-token when streaming), a hedged
+request is sent to the next provider and the first successful answer wins
+while the other is cancelled. Providers that keep failing are skipped by a
+circuit breaker until a cool-down has passed.
+
+Providers only need ``ainvoke(messages)`` and ``astream(messages)``, so fake
+in-process models can stand in for real ones. When a scheduler is given,
+each provider call first takes a slot from it; a provider that is over
+capacity is skipped like a failed one but does not trip its breaker.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import nullcontext
+from typing import Any, AsyncIterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from services.latency_stats import percentile
+from services.llm_scheduler import LLMCapacityExceeded, estimate_prompt_tokens, response_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """Rolling window of request latencies.
+
+    Requests cancelled before finishing (the loser of a hedge) are recorded as
+    censored samples: the time they had run, but at least their hedge
+    deadline, since they were slower than that.
+    """
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+        self.censored = 0
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+
+    def observe_censored(self, elapsed: float, deadline: float):
+        self.samples.append(max(elapsed, deadline))
+        self.censored += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        return percentile(self.samples, q)
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and allows a trial request after a cool-down"""
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        return self.state != "open"
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class Provider:
+    """A chat model with its latency history and circuit breaker"""
+
+    def __init__(self, name: str, llm, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.name = name
+        self.llm = llm
+        self.latency = LatencyTracker()
+        # Streaming hedges on time-to-first-token, which is tracked on its own
+        self.first_token = LatencyTracker()
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self.requests = 0
+        self.failures = 0
+        self.wins = 0
+
+    def stats(self) -> dict:
+        p50 = self.latency.percentile(0.5)
+        p95 = self.latency.percentile(0.95)
+        ttft_p95 = self.first_token.percentile(0.95)
+        return {
+            "state": self.breaker.state,
+            "requests": self.requests,
+            "failures": self.failures,
+            "wins": self.wins,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "first_token_p95_ms": round(ttft_p95 * 1000, 1) if ttft_p95 is not None else None,
+            "censored_samples": self.latency.censored + self.first_token.censored,
+        }
+
+
+class AllProvidersFailed(Exception):
+    """Raised when no provider produced an answer"""
+
+
+class LLMRouter:
+    """Hedged, failover-aware dispatch over an ordered list of providers"""
+
+    def __init__(self, providers: List[Provider], initial_deadline: float = 4.0,
+                 min_deadline: float = 0.5, max_deadline: float = 15.0, min_samples: int = 20,
+                 scheduler=None, max_output_tokens: int = 1000):
+        if not providers:
+            raise ValueError("LLMRouter needs at least one provider")
+        self.providers = providers
+        self.initial_deadline = initial_deadline
+        self.min_deadline = min_deadline
+        self.max_deadline = max_deadline
+        self.min_samples = min_samples
+        self.scheduler = scheduler
+        self.max_output_tokens = max_output_tokens
+        self.hedged_requests = 0
+        self.failovers = 0
+
+    def hedge_deadline(self, provider: Provider, streaming: bool = False) -> float:
+        """Time to wait for a provider before hedging: its p95 (time-to-first-token when streaming) once enough samples exist"""
+        tracker = provider.first_token if streaming else provider.latency
+        if len(tracker.samples) < self.min_samples:
+            return self.initial_deadline
+        p95 = tracker.percentile(0.95)
+        return min(self.max_deadline, max(self.min_deadline, p95))
+
+    def _candidates(self) -> List[Provider]:
+        available = [p for p in self.providers if p.breaker.allow()]
+        # With every breaker open, still try the providers in order
+        return available or list(self.providers)
+
+    def _slot(self, provider: Provider, messages):
+        """Scheduler slot for one call to `provider` (no-op without a scheduler)"""
+        if self.scheduler is None:
+            return nullcontext()
+        text = "".join(str(getattr(m, "content", m)) for m in messages)
+        return self.scheduler.slot(provider.name, estimate_prompt_tokens(text, self.max_output_tokens))
+
+    async def _call(self, provider: Provider, messages):
+        async with self._slot(provider, messages) as reservation:
+            provider.requests += 1
+            start = time.perf_counter()
+            try:
+                result = await provider.llm.ainvoke(messages)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                provider.failures += 1
+                provider.breaker.record_failure()
+                raise
+            if reservation is not None:
+                reservation.record(response_tokens(result))
+        provider.latency.observe(time.perf_counter() - start)
+        provider.breaker.record_success()
+        return result
+
+    async def _stream(self, provider: Provider, messages):
+        async with self._slot(provider, messages) as reservation:
+            provider.requests += 1
+            reported = None
+            output_chars = 0
+            async for chunk in provider.llm.astream(messages):
+                # Providers that report streaming usage put it on one of the chunks
+                reported = response_tokens(chunk) or reported
+                output_chars += len(str(getattr(chunk, "content", "")))
+                yield chunk
+            if reservation is not None:
+                # Without reported usage, charge the prompt plus what was actually streamed
+                prompt_tokens = reservation.charged - self.max_output_tokens
+                reservation.record(reported or prompt_tokens + output_chars // 4 + 1)
+
+    @staticmethod
+    def _raise_failure(errors):
+        if errors and all(isinstance(e, LLMCapacityExceeded) for _, e in errors):
+            raise min((e for _, e in errors), key=lambda e: e.retry_after)
+        raise AllProvidersFailed("; ".join(f"{name}: {e}" for name, e in errors))
+
+    async def ainvoke(self, messages) -> Any:
+        """Return the first successful answer, hedging slow providers"""
+        candidates = self._candidates()
+        running = {}
+        errors = []
+        next_index = 0
+
+        def launch():
+            nonlocal next_index
+            provider = candidates[next_index]
+            next_index += 1
+            task = asyncio.ensure_future(self._call(provider, messages))
+            running[task] = (provider, time.perf_counter(), self.hedge_deadline(provider))
+            return provider
+
+        current = launch()
+        try:
+            while running:
+                timeout = self.hedge_deadline(current) if next_index < len(candidates) else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Slowest path: hedge with the next provider and keep both in flight
+                    self.hedged_requests += 1
+                    logger.info(f"LLM provider {current.name} exceeded {timeout:.2f}s, hedging")
+                    current = launch()
+                    continue
+
+                for task in done:
+                    provider, _, _ = running.pop(task)
+                    if task.exception() is None:
+                        provider.wins += 1
+                        return task.result()
+                    errors.append((provider.name, task.exception()))
+                    logger.warning(f"LLM provider {provider.name} failed: {task.exception()}")
+
+                if not running and next_index < len(candidates):
+                    self.failovers += 1
+                    current = launch()
+        finally:
+            now = time.perf_counter()
+            for task, (provider, start, deadline) in running.items():
+                task.cancel()
+                provider.latency.observe_censored(now - start, deadline)
+
+        self._raise_failure(errors)
+
+    async def astream(self, messages) -> AsyncIterator[Any]:
+        """Stream from the first provider to emit a token, hedging on time-to-first-token"""
+        candidates = self._candidates()
+        streams = {}  # first-chunk task -> (provider, iterator, start)
+        errors = []
+        next_index = 0
+
+        def launch():
+            nonlocal next_index
+            provider = candidates[next_index]
+            next_index += 1
+            iterator = self._stream(provider, messages).__aiter__()
+            task = asyncio.ensure_future(iterator.__anext__())
+            streams[task] = (provider, iterator, time.perf_counter(), self.hedge_deadline(provider, streaming=True))
+            return provider
+
+        async def close(iterator):
+            if hasattr(iterator, "aclose"):
+                try:
+                    await iterator.aclose()
+                except Exception:
+                    pass
+
+        current = launch()
+        winner = None
+        try:
+            while streams and winner is None:
+                timeout = self.hedge_deadline(current, streaming=True) if next_index < len(candidates) else None
+                done, _ = await asyncio.wait(streams, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    self.hedged_requests += 1
+                    logger.info(f"LLM provider {current.name} gave no token within {timeout:.2f}s, hedging")
+                    current = launch()
+                    continue
+
+                for task in done:
+                    provider, iterator, start, _ = streams.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        provider.first_token.observe(time.perf_counter() - start)
+                        if winner is None:
+                            winner = (provider, iterator, start, task.result())
+                        else:
+                            await close(iterator)
+                    elif isinstance(error, StopAsyncIteration):
+                        # Empty stream counts as an (empty) answer
+                        if winner is None:
+                            winner = (provider, None, start, None)
+                    else:
+                        if not isinstance(error, LLMCapacityExceeded):
+                            provider.failures += 1
+                            provider.breaker.record_failure()
+                        errors.append((provider.name, error))
+                        logger.warning(f"LLM provider {provider.name} failed: {error}")
+
+                if winner is None and not streams and next_index < len(candidates):
+                    self.failovers += 1
+                    current = launch()
+        finally:
+            now = time.perf_counter()
+            for task, (provider, iterator, start, deadline) in streams.items():
+                task.cancel()
+                provider.first_token.observe_censored(now - start, deadline)
+                await close(iterator)
+
+        if winner is None:
+            self._raise_failure(errors)
+
+        provider, iterator, _, first_chunk = winner
+        provider.wins += 1
+        if first_chunk is not None:
+            yield first_chunk
+        if iterator is not None:
+            try:
+                async for chunk in iterator:
+                    yield chunk
+            except Exception:
+                provider.failures += 1
+                provider.breaker.record_failure()
+                raise
+        provider.breaker.record_success()
+
+    def stats(self) -> dict:
+        return {
+            "hedged_requests": self.hedged_requests,
+            "failovers": self.failovers,
+            "providers": {p.name: {**p.stats(), "hedge_deadline_s": round(self.hedge_deadline(p), 3)} for p in self.providers},
+        }
+
+
+class RoutedChatModel(BaseChatModel):
+    """LangChain chat model that dispatches through an LLMRouter, usable in runnable chains"""
+
+    router: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "routed-chat-model"
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        # Synchronous callers get plain ordered failover
+        errors = []
+        for provider in self.router._candidates():
+            try:
+                result = provider.llm.invoke(messages)
+                provider.breaker.record_success()
+                return ChatResult(generations=[ChatGeneration(message=_as_ai_message(result))])
+            except Exception as e:
+                provider.failures += 1
+                provider.breaker.record_failure()
+                errors.append(f"{provider.name}: {e}")
+        raise AllProvidersFailed("; ".join(errors))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        result = await self.router.ainvoke(messages)
+        return ChatResult(generations=[ChatGeneration(message=_as_ai_message(result))])
+
+    async def _astream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        async for chunk in self.router.astream(messages):
+            content = chunk.content if hasattr(chunk, "content") else str(chunk)
+            generation = ChatGenerationChunk(message=AIMessageChunk(content=content))
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(content, chunk=generation)
+            yield generation
+
+
+def _as_ai_message(result) -> AIMessage:
+    if isinstance(result, AIMessage):
+        return result
+    return AIMessage(content=result.content if hasattr(result, "content") else str(result))
+
@@ -0,0 +1,271 @@
+"""
+Shared scheduler for outbound LLM calls.
+
+Every router that calls an LLM provider acquires a slot here first. Each
+provider has a concurrency cap, a requests-per-minute and a tokens-per-minute
+token bucket, and a bounded wait queue. Callers that cannot be served before
+their deadline are rejected straight away instead of piling up retries
+against a provider that is already returning 429s.
+
+Limits are read from the environment, per provider name (upper case):
+    LLM_<PROVIDER>_MAX_CONCURRENCY, LLM_<PROVIDER>_RPM, LLM_<PROVIDER>_TPM
+and LLM_SCHEDULER_MAX_QUEUE / LLM_SCHEDULER_MAX_WAIT_SECONDS for all providers.
+Rate limits are opt-in: without LLM_<PROVIDER>_RPM / _TPM only the
+concurrency cap applies, since the right numbers depend on the account tier.
+
+A call is charged its prompt plus its full output budget on admission; once
+the response reports its usage, the unused part is credited back.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from services.latency_stats import summarize_ms
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+class LLMCapacityExceeded(Exception):
+    """Raised when a call cannot get a provider slot before its deadline"""
+
+    def __init__(self, provider: str, reason: str, retry_after: float = 1.0):
+        super().__init__(f"LLM provider {provider} over capacity ({reason})")
+        self.provider = provider
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def estimate_prompt_tokens(text: str, max_output_tokens: int = 1000) -> int:
+    """Rough token cost of a call: prompt (about four characters per token) plus the output budget"""
+    return len(text) // 4 + 1 + max_output_tokens
+
+
+def response_tokens(response: Any) -> Optional[int]:
+    """Total tokens reported by a LangChain message or a Gemini response, None when not reported"""
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        return None
+    if isinstance(usage, dict):
+        return usage.get("total_tokens")
+    return getattr(usage, "total_token_count", None)
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `per_minute` tokens per minute (no limit when 0)"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self.unlimited = per_minute <= 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (0 when available now)"""
+        if self.unlimited:
+            return 0.0
+        self._refill()
+        # A single call larger than the bucket is allowed once the bucket is full
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        if self.unlimited:
+            return
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def give(self, amount: float):
+        """Return tokens that were charged but not used"""
+        if self.unlimited or amount <= 0:
+            return
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class Reservation:
+    """Tokens charged for one admitted call; `record` settles it against the real usage"""
+
+    def __init__(self, charged: int):
+        self.charged = charged
+        self.used: Optional[int] = None
+
+    def record(self, used: Optional[int]):
+        if used is not None:
+            self.used = used
+
+
+class ProviderQueue:
+    """Concurrency cap, rate buckets and wait queue for a single provider"""
+
+    def __init__(self, name: str, max_concurrency: int, rpm: int, tpm: int, max_queue: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.in_flight = 0
+        self.waiters = deque()
+        self.wait_samples = deque(maxlen=1000)
+        self.max_queue_depth = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_deadline = 0
+        self.tokens_charged = 0
+        self.tokens_credited = 0
+
+    def _admission_wait(self, tokens: int) -> Optional[float]:
+        """None if a concurrency slot is needed, else seconds until the rate buckets allow the call"""
+        if self.in_flight >= self.max_concurrency:
+            return None
+        return max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+
+    def _wake_next(self):
+        if self.waiters:
+            self.waiters[0].set()
+
+    async def acquire(self, tokens: int, deadline: float):
+        start = time.monotonic()
+
+        # Fast path: nobody is waiting and the call can go now
+        if not self.waiters and self._admission_wait(tokens) == 0:
+            self._admit(tokens, start)
+            return
+
+        if len(self.waiters) >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise LLMCapacityExceeded(self.name, "queue full", retry_after=self._retry_after())
+
+        waiter = asyncio.Event()
+        self.waiters.append(waiter)
+        self.max_queue_depth = max(self.max_queue_depth, len(self.waiters))
+        try:
+            while True:
+                # Only the head of the queue may be admitted (FIFO)
+                wait = self._admission_wait(tokens) if self.waiters[0] is waiter else None
+                if wait == 0:
+                    break
+                now = time.monotonic()
+                if wait is not None and now + wait > deadline:
+                    # The buckets cannot refill before the deadline: reject now rather than later
+                    self.rejected_deadline += 1
+                    raise LLMCapacityExceeded(self.name, "rate limit", retry_after=wait)
+                if now >= deadline:
+                    self.rejected_deadline += 1
+                    raise LLMCapacityExceeded(self.name, "wait deadline", retry_after=self._retry_after())
+
+                # Woken by a release or a departing waiter, or poll once the buckets have refilled
+                timeout = deadline - now if wait is None else wait
+                waiter.clear()
+                try:
+                    await asyncio.wait_for(waiter.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.waiters.remove(waiter)
+            self._wake_next()
+
+        self._admit(tokens, start)
+
+    def _admit(self, tokens: int, start: float):
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        self.tokens_charged += tokens
+        self.in_flight += 1
+        self.admitted += 1
+        self.wait_samples.append(time.monotonic() - start)
+
+    def release(self, reservation: Optional[Reservation] = None):
+        self.in_flight -= 1
+        if reservation is not None and reservation.used is not None:
+            unused = reservation.charged - reservation.used
+            if unused > 0:
+                self.tokens.give(unused)
+                self.tokens_credited += unused
+        self._wake_next()
+
+    def _retry_after(self) -> float:
+        return max(1.0, self.requests.wait_time(1))
+
+    def stats(self) -> dict:
+        wait = summarize_ms(self.wait_samples, digits=1)
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": len(self.waiters),
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_deadline": self.rejected_deadline,
+            "wait_p50_ms": wait["p50_ms"],
+            "wait_p95_ms": wait["p95_ms"],
+            "tokens_charged": self.tokens_charged,
+            "tokens_credited": self.tokens_credited,
+            "limits": {
+                "max_concurrency": self.max_concurrency,
+                "rpm": self.requests.capacity or None,
+                "tpm": self.tokens.capacity or None,
+                "max_queue": self.max_queue,
+            },
+        }
+
+
+class LLMScheduler:
+    """Per-provider admission control shared by every LLM-using router"""
+
+    def __init__(self, max_queue: int = 100, max_wait_seconds: float = 10.0):
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self.providers: Dict[str, ProviderQueue] = {}
+
+    def configure(self, name: str, max_concurrency: int, rpm: int, tpm: int):
+        self.providers[name] = ProviderQueue(name, max_concurrency, rpm, tpm, self.max_queue)
+
+    def _queue(self, name: str) -> ProviderQueue:
+        if name not in self.providers:
+            prefix = f"LLM_{name.upper()}_"
+            self.configure(
+                name,
+                max_concurrency=int(os.getenv(prefix + "MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+                rpm=int(os.getenv(prefix + "RPM", "0")),
+                tpm=int(os.getenv(prefix + "TPM", "0")),
+            )
+        return self.providers[name]
+
+    @asynccontextmanager
+    async def slot(self, provider: str, tokens: int = 1000, max_wait: Optional[float] = None):
+        """Hold a provider slot for the duration of one LLM call.
+
+        Yields a Reservation; pass the response usage to `record` so unused
+        output budget goes back to the tokens-per-minute bucket.
+        """
+        queue = self._queue(provider)
+        wait = self.max_wait_seconds if max_wait is None else max_wait
+        await queue.acquire(tokens, time.monotonic() + wait)
+        reservation = Reservation(tokens)
+        try:
+            yield reservation
+        finally:
+            queue.release(reservation)
+
+    def stats(self) -> dict:
+        return {name: queue.stats() for name, queue in self.providers.items()}
+
+
+llm_scheduler = LLMScheduler(
+    max_queue=int(os.getenv("LLM_SCHEDULER_MAX_QUEUE", "100")),
+    max_wait_seconds=float(os.getenv("LLM_SCHEDULER_MAX_WAIT_SECONDS", "10")),
+)
@@ -0,0 +1,220 @@
+"""
+Text retrieval for the assistant's knowledge base.
+
+Language-aware tokenization for Arabic, French and English, a BM25 inverted
+index, a local hashing embedder and a dense passage index whose matrix is
+persisted and memory-mapped across restarts.
+"""
+
+import hashlib
+import heapq
+import logging
+import math
+import os
+import re
+import tempfile
+import unicodedata
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+STOPWORDS = {
+    # English
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "for", "from", "how", "i", "in", "is", "it",
+    "me", "my", "of", "on", "or", "the", "to", "want", "what", "when", "where", "which", "with", "you", "your",
+    # French
+    "au", "aux", "avec", "ce", "ces", "dans", "de", "des", "du", "elle", "en", "est", "et", "je", "la", "le",
+    "les", "leur", "mon", "ne", "nous", "ou", "par", "pas", "pour", "qu", "que", "qui", "sa", "se", "son",
+    "sur", "un", "une", "vous", "veux",
+    # Arabic (after normalization)
+    "في", "من", "الي", "علي", "عن", "مع", "هذا", "هذه", "ان", "او", "ما", "هل", "انا", "كيف", "متي", "اين",
+}
+
+ARABIC_NORMALIZATION = str.maketrans({"أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا", "ى": "ي", "ة": "ه", "ـ": None})
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def fold_text(text: str) -> str:
+    """Lowercase, strip accents/diacritics and normalize Arabic letter variants"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return stripped.translate(ARABIC_NORMALIZATION)
+
+
+def tokenize(text: str) -> List[str]:
+    """Language-aware tokens for Arabic, French and English text"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(fold_text(text)):
+        # Single digits stay: "3 days" and "7 days" must not look alike
+        if (len(token) < 2 and not token.isdigit()) or token in STOPWORDS:
+            continue
+        if "\u0600" <= token[0] <= "\u06ff":
+            # Drop the Arabic definite article (al-, wal-, bal-)
+            for prefix in ("وال", "بال", "ال"):
+                if token.startswith(prefix) and len(token) - len(prefix) >= 2:
+                    token = token[len(prefix):]
+                    break
+        elif len(token) > 3 and token.endswith("s"):
+            # Light plural folding for English/French
+            token = token[:-1]
+        if token not in STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    """Inverted index with BM25 scoring over knowledge base passages"""
+
+    def __init__(self, documents: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}  # term -> list of (doc_id, term frequency)
+        self.doc_lengths = []
+        for doc_id, text in enumerate(documents):
+            counts = Counter(tokenize(text))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, frequency in counts.items():
+                self.postings.setdefault(term, []).append((doc_id, frequency))
+
+        n_docs = len(documents)
+        self.avg_length = (sum(self.doc_lengths) / n_docs) if n_docs else 0.0
+        self.idf = {
+            term: math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def search(self, query: str, k: int = 3) -> List[tuple]:
+        """Top-k (doc_id, score) pairs for the query"""
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf[term]
+            for doc_id, frequency in postings:
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / self.avg_length
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+class HashingEmbedder:
+    """Deterministic local embedder using feature hashing of tokens and character trigrams.
+
+    Works offline and in tests; any object with ``name``, ``dim`` and
+    ``embed(texts) -> float32 array`` can be used instead.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str):
+        for token in tokenize(text):
+            yield token, 1.0
+            padded = f"#{token}#"
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3], 0.5
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if h & 0x80000000 else -1.0
+                vectors[row, h % self.dim] += sign * weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+EMBEDDERS = {"hashing": HashingEmbedder}
+
+
+class VectorIndex:
+    """Dense float32 passage matrix searched with one matrix-vector product.
+
+    The matrix is persisted next to the data and memory-mapped on startup when
+    the passages and embedder are unchanged.
+    """
+
+    BATCH_SIZE = 256
+
+    def __init__(self, embedder, cache_dir: Path):
+        self.embedder = embedder
+        self.cache_dir = cache_dir
+        self.matrix = np.zeros((0, embedder.dim), dtype=np.float32)
+
+    def _fingerprint(self, texts: List[str]) -> str:
+        digest = hashlib.sha1(self.embedder.name.encode("utf-8"))
+        for text in texts:
+            digest.update(b"\0" + text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def build(self, texts: List[str]):
+        """Load the persisted matrix if it matches, otherwise embed in batches and persist"""
+        fingerprint = self._fingerprint(texts)
+        matrix_file = self.cache_dir / f"{fingerprint}.npy"
+
+        if matrix_file.exists():
+            try:
+                self.matrix = np.load(matrix_file, mmap_mode="r")
+                logger.info(f"Loaded {len(texts)} passage embeddings from {matrix_file.name}")
+                return
+            except Exception as e:
+                logger.warning(f"Could not load embeddings {matrix_file.name}: {e}")
+
+        batches = [
+            self.embedder.embed(texts[start:start + self.BATCH_SIZE])
+            for start in range(0, len(texts), self.BATCH_SIZE)
+        ]
+        self.matrix = np.vstack(batches).astype(np.float32) if batches else np.zeros((0, self.embedder.dim), dtype=np.float32)
+
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._persist(matrix_file)
+        except OSError as e:
+            logger.warning(f"Could not persist embeddings: {e}")
+
+    def _persist(self, matrix_file: Path):
+        """Write the matrix atomically, then drop matrices of older passage sets.
+
+        Several workers share the cache dir: the file only appears under its final
+        name once complete, and the file just written is never removed.
+        """
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, prefix=f".{matrix_file.stem}.", suffix=".tmp", delete=False) as tmp:
+            try:
+                np.save(tmp, self.matrix)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            except BaseException:
+                os.unlink(tmp.name)
+                raise
+        os.replace(tmp.name, matrix_file)
+
+        for stale in self.cache_dir.glob("*.npy"):
+            if stale != matrix_file:
+                try:
+                    # A worker that already memory-mapped it keeps its copy
+                    stale.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def search(self, query: str, k: int = 3) -> List[tuple]:
+        """Top-k (doc_id, cosine similarity) pairs for the query"""
+        if len(self.matrix) == 0:
+            return []
+        query_vector = self.embedder.embed([query])[0]
+        scores = self.matrix @ query_vector
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in top if scores[doc_id] > 0]
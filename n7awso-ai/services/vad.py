@@ -0,0 +1,163 @@
+"""
+Energy / zero-crossing voice activity detection for 16 kHz mono PCM.
+
+The noise floor is estimated from the quietest frames of the clip itself, so
+no audio has to be spent calibrating (as adjust_for_ambient_noise does).
+Frames well above the floor, or moderately above it with a speech-like
+zero-crossing rate (fricatives such as "s" and "f"), count as speech. Leading
+and trailing silence is trimmed and silent clips are detected before any
+recognizer call. All frame features are computed with vectorized NumPy.
+"""
+
+import io
+import wave
+from typing import Optional, Tuple
+
+import numpy as np
+
+FRAME_MS = 30
+# Energy must exceed the noise floor by this factor (about 6 dB) to count as speech
+SPEECH_TO_NOISE_RATIO = 4.0
+# Absolute floor on the speech threshold: about -45 dBFS
+MIN_SPEECH_ENERGY = 10 ** (-45 / 10)
+# Zero-crossing rate range of unvoiced speech, per sample
+FRICATIVE_ZCR = (0.1, 0.5)
+# Speech kept before/after detected frames so word edges are not clipped
+PADDING_MS = 200
+MIN_SPEECH_MS = 250
+
+
+def read_pcm(pcm_wav: bytes) -> Tuple[np.ndarray, int]:
+    """Samples (float32 in [-1, 1]) and sample rate of 16-bit mono PCM WAV bytes"""
+    with wave.open(io.BytesIO(pcm_wav)) as wav:
+        rate = wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+    return np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0, rate
+
+
+def write_pcm(samples: np.ndarray, rate: int) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes((np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def frame_features(samples: np.ndarray, frame_length: int):
+    """Per-frame mean energy and zero-crossing rate"""
+    n_frames = len(samples) // frame_length
+    frames = samples[:n_frames * frame_length].reshape(n_frames, frame_length)
+    energy = np.mean(frames * frames, axis=1)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame_length
+    return energy, zcr
+
+
+def detect_speech(samples: np.ndarray, rate: int) -> Tuple[Optional[Tuple[int, int]], dict]:
+    """(start, end) sample range containing speech, or None for a silent clip, plus VAD details"""
+    frame_length = int(rate * FRAME_MS / 1000)
+    energy, zcr = frame_features(samples, frame_length)
+    if len(energy) == 0:
+        return None, {"noise_floor_db": None, "speech_frames": 0}
+
+    noise_floor = float(np.percentile(energy, 10))
+    threshold = max(noise_floor * SPEECH_TO_NOISE_RATIO, MIN_SPEECH_ENERGY)
+    voiced = energy > threshold
+    unvoiced = (energy > threshold / 2) & (zcr >= FRICATIVE_ZCR[0]) & (zcr <= FRICATIVE_ZCR[1])
+    speech = voiced | unvoiced
+
+    details = {
+        "noise_floor_db": round(float(10 * np.log10(noise_floor + 1e-12)), 1),
+        "speech_frames": int(np.count_nonzero(speech)),
+    }
+
+    # A clip that is loud throughout has no quiet frames to estimate noise from: keep it whole
+    if np.count_nonzero(speech) * FRAME_MS < MIN_SPEECH_MS:
+        if noise_floor > MIN_SPEECH_ENERGY * SPEECH_TO_NOISE_RATIO:
+            return (0, len(samples)), details
+        return None, details
+
+    # Pad detected speech so word onsets and endings are kept
+    padding = int(PADDING_MS / FRAME_MS)
+    speech = np.convolve(speech.astype(np.int8), np.ones(2 * padding + 1, dtype=np.int8), mode="same") > 0
+    indices = np.flatnonzero(speech)
+    start = int(indices[0]) * frame_length
+    end = min(len(samples), (int(indices[-1]) + 1) * frame_length)
+    return (start, end), details
+
+
+def trim_silence(pcm_wav: bytes) -> Tuple[Optional[bytes], dict]:
+    """Trim leading/trailing silence; returns (trimmed WAV or None when no speech, details)"""
+    samples, rate = read_pcm(pcm_wav)
+    span, details = detect_speech(samples, rate)
+    details["input_seconds"] = len(samples) / rate
+    if span is None:
+        details["output_seconds"] = 0.0
+        return None, details
+
+    start, end = span
+    details["output_seconds"] = (end - start) / rate
+    if start == 0 and end == len(samples):
+        return pcm_wav, details
+    return write_pcm(samples[start:end], rate), details
+
+
+class UtteranceBuffer:
+    """PCM audio of the utterance being spoken on a voice WebSocket"""
+
+    def __init__(self, sample_rate: int = 16000, endpoint_silence_ms: int = 600):
+        self.sample_rate = sample_rate
+        self.endpoint_silence_ms = endpoint_silence_ms
+        self.pcm = bytearray()
+        self._checked_bytes = 0
+        self._partial_bytes = 0
+
+    def append(self, data: bytes):
+        self.pcm.extend(data)
+
+    @property
+    def seconds(self) -> float:
+        return len(self.pcm) / (2 * self.sample_rate)
+
+    def due_for_check(self, interval_seconds: float) -> bool:
+        """True once interval_seconds of new audio arrived since the last check"""
+        if len(self.pcm) - self._checked_bytes < interval_seconds * 2 * self.sample_rate:
+            return False
+        self._checked_bytes = len(self.pcm)
+        return True
+
+    def samples(self) -> np.ndarray:
+        usable = len(self.pcm) - len(self.pcm) % 2
+        return np.frombuffer(bytes(self.pcm[:usable]), dtype="<i2").astype(np.float32) / 32768.0
+
+    def speech_ended(self) -> bool:
+        """Speech was heard and has been followed by endpoint_silence_ms of silence"""
+        samples = self.samples()
+        span, _ = detect_speech(samples, self.sample_rate)
+        return span is not None and len(samples) - span[1] >= self.endpoint_silence_ms * self.sample_rate / 1000
+
+    def _wav(self, pcm: bytes) -> bytes:
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(pcm[:len(pcm) - len(pcm) % 2])
+        return buffer.getvalue()
+
+    def to_wav(self) -> bytes:
+        return self._wav(bytes(self.pcm))
+
+    def take_partial_wav(self) -> bytes:
+        """Audio received since the previous call, so partials never re-send earlier speech"""
+        end = len(self.pcm) - len(self.pcm) % 2
+        segment = bytes(self.pcm[self._partial_bytes:end])
+        self._partial_bytes = end
+        return self._wav(segment)
+
+    def clear(self):
+        self.pcm = bytearray()
+        self._checked_bytes = 0
+        self._partial_bytes = 0
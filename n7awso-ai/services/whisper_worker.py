@@ -0,0 +1,81 @@
+"""
+Whisper inference for ASR worker processes.
+
+Runs inside a worker process: the model is loaded on first use and kept for
+the life of the process, and a batch of short clips is decoded in one
+inference call. Imports are kept light so worker processes start quickly.
+"""
+
+import io
+import time
+import wave
+
+import numpy as np
+
+# Whisper's own silence rule: a clip is silent when the no-speech probability is
+# high and the decoded text is not confident (this drops hallucinations like "Thank you.")
+NO_SPEECH_THRESHOLD = 0.6
+LOGPROB_THRESHOLD = -1.0
+
+_models = {}
+
+
+def load_model(model_size: str):
+    """Whisper model of the given size, loaded once per process"""
+    if model_size not in _models:
+        import whisper
+        _models[model_size] = whisper.load_model(model_size, device="cpu")
+    return _models[model_size]
+
+
+def wav_to_float32(pcm_wav: bytes) -> np.ndarray:
+    """16 kHz mono 16-bit PCM WAV bytes -> float32 samples in [-1, 1]"""
+    with wave.open(io.BytesIO(pcm_wav)) as wav:
+        frames = wav.readframes(wav.getnframes())
+    return np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def is_silent(result) -> bool:
+    """Whether a decoding result is Whisper's output for a clip without speech"""
+    return result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD
+
+
+def transcribe_batch(model_size: str, clips, language=None):
+    """Transcribe PCM WAV clips; clips up to 30 s share one batched decode.
+
+    Returns (texts, inference seconds).
+    """
+    import torch
+    import whisper
+
+    start = time.perf_counter()
+    model = load_model(model_size)
+    audios = [wav_to_float32(clip) for clip in clips]
+    texts = [None] * len(audios)
+
+    short = [i for i, audio in enumerate(audios) if len(audio) <= whisper.audio.N_SAMPLES]
+    if short:
+        n_mels = getattr(model.dims, "n_mels", 80)
+        mels = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(audios[i]), n_mels) for i in short
+        ])
+        options = whisper.DecodingOptions(language=language, fp16=False, without_timestamps=True)
+        with torch.no_grad():
+            results = whisper.decode(model, mels, options)
+        for i, result in zip(short, results):
+            texts[i] = "" if is_silent(result) else result.text.strip()
+
+    # Longer clips go through the sliding-window transcriber one at a time
+    for i, audio in enumerate(audios):
+        if texts[i] is None:
+            texts[i] = model.transcribe(
+                audio, language=language, fp16=False,
+                no_speech_threshold=NO_SPEECH_THRESHOLD, logprob_threshold=LOGPROB_THRESHOLD
+            )["text"].strip()
+
+    return texts, time.perf_counter() - start
+
+
+def warm_up(model_size: str) -> bool:
+    load_model(model_size)
+    return True
@@ -0,0 +1,113 @@
+"""
+Bounded executor pools for blocking work called from async routes.
+
+A pool runs synchronous functions on a dedicated thread (or process) pool
+with its own concurrency limit and a bounded wait queue, so a burst of slow
+jobs cannot freeze the event loop or grow an unbounded backlog. Queue time
+(submit to start) and run time are recorded per pool.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from services.latency_stats import summarize_ms
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPoolFull(Exception):
+    """Raised when a pool's wait queue is full"""
+
+
+def _timed_call(fn, args, kwargs, submitted_at):
+    """Run fn in the worker and return (result, queue seconds, run seconds)"""
+    started = time.time()
+    result = fn(*args, **kwargs)
+    return result, started - submitted_at, time.time() - started
+
+
+class BoundedWorkerPool:
+    """Thread or process pool with a concurrency cap, bounded queue and timing metrics"""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, kind: str = "thread"):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.kind = kind
+        self._executor = None
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.queue_samples = deque(maxlen=1000)
+        self.run_samples = deque(maxlen=1000)
+
+    @property
+    def executor(self):
+        # Created on first use so importing a router does not spawn workers
+        if self._executor is None:
+            if self.kind == "process":
+                # spawn: forking a process that runs an event loop and threads is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        return self._executor
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the pool; cancelling the caller cancels work that has not started"""
+        if self.pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise WorkerPoolFull(f"{self.name} pool is busy ({self.pending} jobs pending)")
+
+        self.pending += 1
+        loop = asyncio.get_running_loop()
+        # Wall-clock time so the submit time is comparable inside a worker process
+        call = partial(_timed_call, fn, args, kwargs, time.time())
+        try:
+            result, queue_seconds, run_seconds = await loop.run_in_executor(self.executor, call)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+
+        self.completed += 1
+        self.queue_samples.append(queue_seconds)
+        self.run_samples.append(run_seconds)
+        return result
+
+    def prestart(self):
+        """Start the workers now (process start-up is slow) instead of on the first job"""
+        for _ in range(self.max_workers):
+            self.executor.submit(int)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "pending": self.pending,
+            "queued": max(0, self.pending - self.max_workers),
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+            "queue_time": summarize_ms(self.queue_samples),
+            "run_time": summarize_ms(self.run_samples),
+        }
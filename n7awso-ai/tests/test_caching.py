@@ -0,0 +1,144 @@
+from types import SimpleNamespace
+
+import pytest
+
+from services import caching
+from services.caching import ResponseCache, SessionHistoryCache, TranscriptionCache
+from services.retrieval import HashingEmbedder
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(caching, "time", clock)
+    return clock
+
+
+def history(size_bytes=10):
+    return SimpleNamespace(size_bytes=size_bytes)
+
+
+def test_session_cache_evicts_least_recently_used(clock):
+    cache = SessionHistoryCache(max_sessions=2, max_bytes=1000, idle_ttl_seconds=60)
+    cache.put("a", history())
+    cache.put("b", history())
+    cache.get("a")
+    cache.put("c", history())
+
+    assert "a" in cache and "c" in cache
+    assert "b" not in cache
+    assert cache.evictions == 1
+
+
+def test_session_cache_evicts_over_the_byte_budget_but_keeps_the_newest(clock):
+    cache = SessionHistoryCache(max_sessions=10, max_bytes=100, idle_ttl_seconds=60)
+    cache.put("a", history(60))
+    cache.put("b", history(60))
+    assert "a" not in cache and "b" in cache
+
+    # A single session over the budget stays: it is the one being used
+    cache.put("c", history(500))
+    assert list(cache._entries) == ["c"]
+    assert cache.total_bytes() == 500
+
+
+def test_session_cache_expires_idle_sessions(clock):
+    cache = SessionHistoryCache(max_sessions=10, max_bytes=1000, idle_ttl_seconds=60)
+    cache.put("a", history())
+    clock.now += 61
+
+    assert cache.get("a") is None
+    assert cache.expirations == 1
+
+    # Loading it again counts as a reload of an evicted session
+    cache.put("a", history())
+    assert cache.reloads == 1
+    assert cache.get("a") is not None
+
+
+def test_session_cache_pop_is_not_an_eviction(clock):
+    cache = SessionHistoryCache(max_sessions=10, max_bytes=1000, idle_ttl_seconds=60)
+    entry = history()
+    cache.put("a", entry)
+
+    assert cache.pop("a") is entry
+    assert cache.evictions == 0
+    cache.put("a", history())
+    assert cache.reloads == 0
+
+
+def test_response_cache_evicts_oldest_entries(clock):
+    cache = ResponseCache(HashingEmbedder(), max_entries=2, ttl_seconds=60, similarity_threshold=None)
+    cache.put("Best beaches in Oran?", (1,), "A")
+    cache.put("Tours in Tlemcen", (2,), "B")
+    cache.put("Desert trips", (3,), "C")
+
+    assert cache.get("best beaches in oran", (1,)) is None
+    assert cache.get("Tours in Tlemcen!", (2,)) == "B"
+    assert cache.evictions == 1
+    assert cache._by_snippets.keys() == {(2,), (3,)}
+
+
+def test_response_cache_entries_expire(clock):
+    cache = ResponseCache(HashingEmbedder(), max_entries=10, ttl_seconds=60, similarity_threshold=None)
+    cache.put("Tours in Tlemcen", (2,), "B")
+    clock.now += 61
+
+    assert cache.get("Tours in Tlemcen", (2,)) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_response_cache_similar_hits_need_same_user_and_details(clock):
+    cache = ResponseCache(HashingEmbedder(), max_entries=10, ttl_seconds=60, similarity_threshold=0.5)
+    cache.put("price of the 3 day Tlemcen tour", (1,), "A", user_id="u1")
+
+    assert cache.get("price of the 3 day Tlemcen tour please", (1,), "u1") == "A"
+    assert cache.get("price of the 3 day Tlemcen tour please", (1,), "u2") is None
+    assert cache.get("price of the 7 day Tlemcen tour", (1,), "u1") is None
+    assert cache.get("price of the 3 day Oran tour", (1,), "u1") is None
+
+
+def test_transcription_cache_evicts_oldest_entries(clock):
+    cache = TranscriptionCache(max_entries=2, ttl_seconds=60)
+    cache.put(["a"], "first", 1.0)
+    cache.put(["b"], "second", 1.0)
+    cache.get("a")
+    cache.put(["c"], "third", 1.0)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "first"
+    assert cache.get("c") == "third"
+
+
+def test_transcription_cache_entries_expire(clock):
+    cache = TranscriptionCache(max_entries=10, ttl_seconds=60)
+    cache.put(["a"], "text", 1.0)
+    clock.now += 61
+
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_transcription_cache_counts_raw_and_pcm_hits(clock):
+    cache = TranscriptionCache(max_entries=10, ttl_seconds=60)
+    raw_key = TranscriptionCache.key(b"webm bytes", "fr")
+    pcm_key = TranscriptionCache.key(b"pcm bytes", "fr")
+    cache.put([raw_key, pcm_key], "bonjour", 2.5)
+
+    assert cache.get(raw_key) == "bonjour"
+    assert cache.get(pcm_key, normalized=True) == "bonjour"
+    stats = cache.stats()
+    assert (stats["raw_hits"], stats["pcm_hits"], stats["saved_seconds"]) == (1, 1, 5.0)
+
+
+def test_transcription_cache_key_depends_on_language():
+    assert TranscriptionCache.key(b"audio", "fr") != TranscriptionCache.key(b"audio", "ar")
+    assert TranscriptionCache.key(b"audio", "fr") == TranscriptionCache.key(b"audio", "fr")
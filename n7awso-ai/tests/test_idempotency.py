@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from services.idempotency import IdempotencyConflict, IdempotencyTable
+
+
+class Turn:
+    """Turn factory that counts its calls and waits for a release"""
+
+    def __init__(self, result=None, error=None):
+        self.calls = 0
+        self.result = result or {"response": "hello"}
+        self.error = error
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def test_concurrent_retry_joins_the_running_turn():
+    async def main():
+        table = IdempotencyTable(max_entries=10, ttl_seconds=60)
+        turn = Turn()
+        first = asyncio.create_task(table.run("k", "fp", turn))
+        second = asyncio.create_task(table.run("k", "fp", turn))
+        await asyncio.sleep(0)
+        turn.release.set()
+        return await asyncio.gather(first, second), turn, table
+
+    results, turn, table = asyncio.run(main())
+    assert results == [turn.result, turn.result]
+    assert turn.calls == 1
+    assert table.in_flight_joins == 1
+
+
+def test_completed_turn_is_replayed():
+    async def main():
+        table = IdempotencyTable(max_entries=10, ttl_seconds=60)
+        turn = Turn()
+        turn.release.set()
+        await table.run("k", "fp", turn)
+        return await table.run("k", "fp", turn), turn, table
+
+    result, turn, table = asyncio.run(main())
+    assert result == turn.result
+    assert turn.calls == 1
+    assert table.completed_replays == 1
+
+
+def test_failed_turn_can_be_retried():
+    async def main():
+        table = IdempotencyTable(max_entries=10, ttl_seconds=60)
+        failing = Turn(error=RuntimeError("LLM down"))
+        failing.release.set()
+        with pytest.raises(RuntimeError):
+            await table.run("k", "fp", failing)
+
+        turn = Turn()
+        turn.release.set()
+        return await table.run("k", "fp", turn), turn
+
+    result, turn = asyncio.run(main())
+    assert result == turn.result
+    assert turn.calls == 1
+
+
+def test_turn_survives_a_cancelled_caller():
+    async def main():
+        table = IdempotencyTable(max_entries=10, ttl_seconds=60)
+        turn = Turn()
+        caller = asyncio.create_task(table.run("k", "fp", turn))
+        await asyncio.sleep(0)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+
+        retry = asyncio.create_task(table.run("k", "fp", turn))
+        await asyncio.sleep(0)
+        turn.release.set()
+        return await retry, turn
+
+    result, turn = asyncio.run(main())
+    assert result == turn.result
+    assert turn.calls == 1
+
+
+def test_reused_key_with_different_body_conflicts():
+    async def main():
+        table = IdempotencyTable(max_entries=10, ttl_seconds=60)
+        turn = Turn()
+        turn.release.set()
+        await table.run("k", table.fingerprint("s1", "hello"), turn)
+        await table.run("k", table.fingerprint("s1", "bye"), turn)
+
+    with pytest.raises(IdempotencyConflict):
+        asyncio.run(main())
+
+
+def test_eviction_keeps_running_turns():
+    async def main():
+        table = IdempotencyTable(max_entries=1, ttl_seconds=60)
+        running = Turn()
+        first = asyncio.create_task(table.run("running", "fp", running))
+        await asyncio.sleep(0)
+
+        done = Turn()
+        done.release.set()
+        await table.run("done", "fp", done)
+        # Over the limit while the first turn runs; only the finished turn is evicted
+        entries = list(table._entries)
+
+        running.release.set()
+        await first
+        return entries, table
+
+    entries, table = asyncio.run(main())
+    assert entries == ["running"]
+    assert table.evictions == 1
+    assert table.stats()["in_flight"] == 0
@@ -0,0 +1,129 @@
+import asyncio
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from routers import recommendation_system as rs
+
+
+@pytest.fixture(autouse=True)
+def model_state(monkeypatch):
+    monkeypatch.setattr(rs, "user_offer_matrix", pd.DataFrame(
+        [[1, 0], [0, 2]], index=pd.Index([1, 2]), columns=pd.Index([10, 11])
+    ))
+    monkeypatch.setattr(rs, "popularity_scores", {10: 1, 11: 2})
+    monkeypatch.setattr(rs, "user_interactions", {1: {10}, 2: {11}})
+    monkeypatch.setattr(rs, "event_unconfirmed", rs.deque())
+    monkeypatch.setattr(rs, "event_rows_unknown_user", 0)
+    monkeypatch.setattr(rs, "known_users", rs.KnownUsers(max_size=100, ttl_seconds=60))
+
+
+def event(user_id, offer_id, type="view"):
+    return rs.InteractionEvent(user_id=user_id, offer_id=offer_id, type=type)
+
+
+def test_apply_updates_existing_pairs_with_the_strongest_signal():
+    rs.apply_interaction_events([event(1, 11, "click"), event(1, 11, "view"), event(2, 11, "view")])
+
+    assert rs.user_offer_matrix.at[1, 11] == 2
+    # A weaker event never lowers a stored interaction
+    assert rs.user_offer_matrix.at[2, 11] == 2
+    assert rs.popularity_scores[11] == 2 + 2 + 1 + 1
+    assert rs.user_interactions[1] == {10, 11}
+
+
+def test_apply_grows_the_matrix_for_new_users_and_offers():
+    rs.apply_interaction_events([event(3, 10, "enroll"), event(3, 12, "view"), event(4, 12, "click")])
+
+    matrix = rs.user_offer_matrix
+    assert list(matrix.index) == [1, 2, 3, 4]
+    assert list(matrix.columns) == [10, 11, 12]
+    assert matrix.loc[3].tolist() == [3, 0, 1]
+    assert matrix.loc[4].tolist() == [0, 0, 2]
+    # Existing rows are padded with zeros, not NaN
+    assert matrix.loc[1].tolist() == [1, 0, 0]
+    assert rs.popularity_scores[10] == 1 + 3 + rs.ENROLLMENT_BONUS
+
+
+def test_apply_without_events_leaves_the_model_untouched():
+    before = rs.user_offer_matrix.copy()
+    rs.apply_interaction_events([])
+    pd.testing.assert_frame_equal(rs.user_offer_matrix, before)
+
+
+def test_known_users_are_bounded_and_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rs.time, "monotonic", lambda: now[0])
+    known = rs.KnownUsers(max_size=2, ttl_seconds=10)
+
+    known.add([1, 2, 3])
+    assert len(known) == 2
+    assert 1 not in known and 3 in known
+
+    now[0] += 11
+    assert 3 not in known
+    assert len(known) == 1
+
+
+class FakeUsers:
+    def __init__(self, existing, down=False):
+        self.existing = existing
+        self.down = down
+        self.lookups = 0
+
+    async def find_many(self, where):
+        self.lookups += 1
+        if self.down:
+            raise ConnectionError("database unavailable")
+        return [SimpleNamespace(id=user_id) for user_id in where["id"]["in"] if user_id in self.existing]
+
+
+def test_flusher_confirms_users_and_drops_unknown_ones(monkeypatch):
+    users = FakeUsers(existing={3})
+    monkeypatch.setattr(rs, "prisma", SimpleNamespace(user=users, is_connected=lambda: True))
+    items = [(event(3, 10, "click"), False), (event(99, 10), False), (event(1, 11), True)]
+
+    kept = asyncio.run(rs.confirm_event_users(items))
+
+    assert [item[0].user_id for item in kept] == [3, 1]
+    assert rs.event_rows_unknown_user == 1
+    assert 3 in rs.known_users
+    # Only the newly confirmed user's event is applied now; user 1 was applied at ingest
+    assert rs.user_offer_matrix.at[3, 10] == 2
+    assert rs.user_offer_matrix.at[1, 11] == 0
+    assert 99 not in rs.user_offer_matrix.index
+
+
+def test_flusher_keeps_events_when_users_cannot_be_confirmed(monkeypatch):
+    users = FakeUsers(existing={3}, down=True)
+    monkeypatch.setattr(rs, "prisma", SimpleNamespace(user=users, is_connected=lambda: True))
+    items = [(event(3, 10), False), (event(1, 11), True)]
+
+    kept = asyncio.run(rs.confirm_event_users(items))
+
+    assert [item[0].user_id for item in kept] == [1]
+    assert [item[0].user_id for item in rs.event_unconfirmed] == [3]
+    assert 3 not in rs.user_offer_matrix.index
+
+
+def test_ingest_does_not_query_users(monkeypatch):
+    users = FakeUsers(existing={1, 3})
+    monkeypatch.setattr(rs, "prisma", SimpleNamespace(user=users, is_connected=lambda: True))
+    monkeypatch.setattr(rs, "is_initialized", True)
+    monkeypatch.setattr(rs, "offers_df", pd.DataFrame({"offer_id": [10, 11]}))
+    monkeypatch.setattr(rs, "start_event_flusher", lambda: None)
+    rs.known_users.add([1])
+
+    async def ingest():
+        monkeypatch.setattr(rs, "event_queue", asyncio.Queue(maxsize=rs.EVENT_QUEUE_MAX_SIZE))
+        batch = rs.InteractionEventBatch(events=[event(1, 11, "click"), event(3, 10), event(1, 12)])
+        return await rs.ingest_events(batch), [rs.event_queue.get_nowait() for _ in range(rs.event_queue.qsize())]
+
+    result, queued = asyncio.run(ingest())
+
+    assert result["accepted"] == 2 and result["rejected"] == 1
+    assert users.lookups == 0
+    assert [(item[0].user_id, item[1]) for item in queued] == [(1, True), (3, False)]
+    assert rs.user_offer_matrix.at[1, 11] == 2
+    assert 3 not in rs.user_offer_matrix.index
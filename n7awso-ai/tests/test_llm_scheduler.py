@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from services.llm_scheduler import LLMCapacityExceeded, LLMScheduler, TokenBucket
+
+
+def scheduler(max_concurrency=1, rpm=0, tpm=0, max_queue=10, max_wait_seconds=1.0):
+    scheduler = LLMScheduler(max_queue=max_queue, max_wait_seconds=max_wait_seconds)
+    scheduler.configure("groq", max_concurrency=max_concurrency, rpm=rpm, tpm=tpm)
+    return scheduler
+
+
+async def hold(scheduler, release: asyncio.Event, started: asyncio.Event = None):
+    async with scheduler.slot("groq"):
+        if started is not None:
+            started.set()
+        await release.wait()
+
+
+def test_rejects_when_the_queue_is_full():
+    async def main():
+        llm = scheduler(max_concurrency=1, max_queue=1)
+        release, started = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(llm, release, started))
+        await started.wait()
+        waiter = asyncio.create_task(hold(llm, release))
+        await asyncio.sleep(0)
+
+        with pytest.raises(LLMCapacityExceeded) as rejected:
+            async with llm.slot("groq"):
+                pass
+        assert rejected.value.reason == "queue full"
+
+        release.set()
+        await asyncio.gather(holder, waiter)
+        return llm.stats()["groq"]
+
+    stats = asyncio.run(main())
+    assert stats["admitted"] == 2
+    assert stats["rejected_queue_full"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_rejects_a_waiter_at_its_deadline():
+    async def main():
+        llm = scheduler(max_concurrency=1)
+        release, started = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(llm, release, started))
+        await started.wait()
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        with pytest.raises(LLMCapacityExceeded) as rejected:
+            async with llm.slot("groq", max_wait=0.05):
+                pass
+        waited = loop.time() - start
+
+        release.set()
+        await holder
+        return rejected.value, waited, llm.stats()["groq"]
+
+    error, waited, stats = asyncio.run(main())
+    assert error.reason == "wait deadline"
+    assert 0.04 <= waited < 0.5
+    assert stats["rejected_deadline"] == 1
+    assert stats["queue_depth"] == 0
+
+
+def test_rejects_at_once_when_the_rate_limit_cannot_refill_in_time():
+    async def main():
+        llm = scheduler(max_concurrency=8, rpm=1)
+        async with llm.slot("groq"):
+            pass
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        with pytest.raises(LLMCapacityExceeded) as rejected:
+            async with llm.slot("groq", max_wait=1.0):
+                pass
+        return rejected.value, loop.time() - start
+
+    error, waited = asyncio.run(main())
+    assert error.reason == "rate limit"
+    # One request per minute cannot refill within the 1 s deadline
+    assert waited < 0.1
+    assert error.retry_after > 1.0
+
+
+def test_a_released_slot_admits_the_next_waiter():
+    async def main():
+        llm = scheduler(max_concurrency=1)
+        order = []
+
+        async def call(name):
+            async with llm.slot("groq"):
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(call(name) for name in "abc"))
+        return order, llm.stats()["groq"]
+
+    order, stats = asyncio.run(main())
+    assert order == ["a", "b", "c"]
+    assert stats["max_queue_depth"] == 2
+
+
+def test_unused_output_budget_is_credited_back():
+    async def main():
+        llm = scheduler(max_concurrency=8, tpm=3000)
+        async with llm.slot("groq", tokens=1000) as reservation:
+            reservation.record(200)
+        return llm.providers["groq"]
+
+    queue = asyncio.run(main())
+    assert queue.tokens_charged == 1000
+    assert queue.tokens_credited == 800
+    assert queue.tokens.tokens == pytest.approx(2800, abs=5)
+
+
+def test_token_bucket_without_limit_never_waits():
+    bucket = TokenBucket(0)
+    bucket.take(10 ** 9)
+    assert bucket.wait_time(10 ** 9) == 0.0
@@ -0,0 +1,103 @@
+import numpy as np
+
+from services.vad import UtteranceBuffer, read_pcm, trim_silence, write_pcm
+
+RATE = 16000
+
+
+def noise(seconds, level=0.001, seed=0):
+    return np.random.default_rng(seed).normal(0.0, level, int(seconds * RATE)).astype(np.float32)
+
+
+def tone(seconds, frequency=220.0, level=0.3):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (level * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def test_silent_clip_has_no_speech():
+    trimmed, details = trim_silence(write_pcm(noise(1.0), RATE))
+
+    assert trimmed is None
+    assert details["speech_frames"] == 0
+    assert details["output_seconds"] == 0.0
+
+
+def test_speech_is_trimmed_with_padding():
+    clip = np.concatenate([noise(1.0, seed=1), tone(1.0), noise(1.0, seed=2)])
+    trimmed, details = trim_silence(write_pcm(clip, RATE))
+
+    assert trimmed is not None
+    samples, rate = read_pcm(trimmed)
+    assert rate == RATE
+    # One second of speech plus about 200 ms of padding on each side
+    assert 1.3 <= len(samples) / RATE <= 1.5
+    assert details["input_seconds"] == 3.0
+    assert details["output_seconds"] == len(samples) / RATE
+
+
+def test_too_short_burst_is_not_speech():
+    clip = np.concatenate([noise(1.0, seed=1), tone(0.1), noise(1.0, seed=2)])
+    trimmed, _ = trim_silence(write_pcm(clip, RATE))
+
+    assert trimmed is None
+
+
+def test_loud_clip_without_quiet_frames_is_kept_whole():
+    pcm_wav = write_pcm(noise(1.0, level=0.2), RATE)
+    trimmed, details = trim_silence(pcm_wav)
+
+    assert trimmed == pcm_wav
+    assert details["output_seconds"] == 1.0
+
+
+def test_empty_clip_has_no_speech():
+    trimmed, details = trim_silence(write_pcm(np.zeros(0, dtype=np.float32), RATE))
+
+    assert trimmed is None
+    assert details["noise_floor_db"] is None
+
+
+def pcm16(samples):
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def test_utterance_ends_after_endpoint_silence():
+    buffer = UtteranceBuffer(sample_rate=RATE, endpoint_silence_ms=600)
+    buffer.append(pcm16(noise(0.5, seed=1)))
+    assert not buffer.speech_ended()
+
+    buffer.append(pcm16(tone(1.0)))
+    assert not buffer.speech_ended()
+
+    # Trailing padding counts as speech, so 600 ms of silence needs a bit more audio
+    buffer.append(pcm16(noise(0.5, seed=2)))
+    assert not buffer.speech_ended()
+    buffer.append(pcm16(noise(0.5, seed=3)))
+    assert buffer.speech_ended()
+
+
+def test_utterance_checks_are_due_per_interval():
+    buffer = UtteranceBuffer(sample_rate=RATE)
+    buffer.append(pcm16(noise(0.2)))
+    assert not buffer.due_for_check(0.25)
+
+    buffer.append(pcm16(noise(0.1)))
+    assert buffer.due_for_check(0.25)
+    assert not buffer.due_for_check(0.25)
+
+
+def test_partials_only_carry_new_audio():
+    buffer = UtteranceBuffer(sample_rate=RATE)
+    buffer.append(pcm16(tone(0.5)))
+    first, _ = read_pcm(buffer.take_partial_wav())
+    buffer.append(pcm16(tone(0.25)) + b"\x00")
+    second, _ = read_pcm(buffer.take_partial_wav())
+
+    assert len(first) == RATE // 2
+    # The odd trailing byte waits for the rest of its sample
+    assert len(second) == RATE // 4
+    assert len(read_pcm(buffer.to_wav())[0]) == 3 * RATE // 4
+
+    buffer.clear()
+    assert buffer.seconds == 0.0
+    assert len(read_pcm(buffer.take_partial_wav())[0]) == 0